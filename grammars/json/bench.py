@@ -0,0 +1,55 @@
+from lalr.lrk import validate
+from main import LexerJSON, ParserJSON
+from time import perf_counter
+
+
+def timed(parser, tokens, lexer):
+	t = perf_counter()
+	result, error = parser.parse(tokens, lexer)
+	if error:
+		raise SystemExit(error)
+	return perf_counter()-t
+
+
+def timed_recognise(parser, tokens, lexer):
+	t = perf_counter()
+	error = parser.validate(tokens, lexer)
+	if error:
+		raise SystemExit(error)
+	return perf_counter()-t
+
+
+def timed_validate(parser, text):
+	t = perf_counter()
+	lexer = LexerJSON(text, convert=False)
+	error = parser.validate(lexer.iter_tokens(), lexer)
+	if error:
+		raise SystemExit(error)
+	return perf_counter()-t
+
+
+def timed_full(parser, text):
+	t = perf_counter()
+	lexer = LexerJSON(text)
+	result, error = parser.parse(lexer.iter_tokens(), lexer)
+	if error:
+		raise SystemExit(error)
+	return perf_counter()-t
+
+
+if __name__ == "__main__":
+	text = open("data.json", "r").read()
+	lexer = LexerJSON(text)
+	tokens, error = lexer.tokens()
+	parser = ParserJSON()
+	parser.freeze()
+	counters = {"reductions": 0, "saved": 0}
+	validate(parser.TABLE, tokens, lexer, counters)
+	steps = len(tokens)+counters["reductions"]
+	best = min(timed(parser, tokens, lexer) for _ in range(200))
+	print(f"{len(tokens)} tokens, {steps} steps: {best*1000:.3f} ms, {steps/best:,.0f} steps/s")
+	recognise = min(timed_recognise(parser, tokens, lexer) for _ in range(200))
+	print(f"validate: {recognise*1000:.3f} ms")
+	full = min(timed_full(parser, text) for _ in range(200))
+	valid = min(timed_validate(parser, text) for _ in range(200))
+	print(f"lex+parse: {full*1000:.3f} ms, lex+validate: {valid*1000:.3f} ms")
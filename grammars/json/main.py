@@ -6,21 +6,21 @@ from time import time
 class LexerJSON(Lexer):
 	ENTRIES = ["{", "}", "[", "]", ",", ":"]
 
-	@token("[-+]?([0-9]+\.[0-9]*|\.[0-9]+|[0-9]+)")
+	@token("[-+]?([0-9]+\.[0-9]*|\.[0-9]+|[0-9]+)", type="num")
 	def _(self, val):
-		return float(val), "num"
-	@token('"(\\"|[^"])*?"')
+		return float(val)
+	@token('"(\\"|[^"])*?"', type="str")
 	def _(self, val):
-		return val[1:-1], "str"
-	@token('\'(\\"|[^"])*?\'')
+		return val[1:-1]
+	@token('\'(\\"|[^"])*?\'', type="str")
 	def _(self, val):
-		return val[1:-1], "str"
-	@token("true")
+		return val[1:-1]
+	@token("true", type="bool")
 	def _(self, val):
-		return True, "bool"
-	@token("false")
+		return True
+	@token("false", type="bool")
 	def _(self, val):
-		return False, "bool"
+		return False
 	@token("[ \t\r\n]+")
 	def _(self, val):
 		pass
@@ -80,16 +80,11 @@ class ParserJSON(Parser):
 
 
 if __name__ == "__main__":
-	text = open("data.json", "r").read()
-	lexer = LexerJSON(text)
-	tokens, error = lexer.tokens()
+	lexer = LexerJSON.from_file("data.json")
+	t = time()
+	result, error = ParserJSON().parse(lexer.iter_tokens(), lexer)
 	if error:
 		print(error)
 	else:
-		t = time()
-		result, error = ParserJSON.parse(tokens, lexer)
-		if error:
-			print(error)
-		else:
-			print(result)
-		print(time()-t)
+		print(result)
+	print(time()-t)
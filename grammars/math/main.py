@@ -9,43 +9,41 @@ class LexerMath(Lexer):
 		return float(val), "num"
 
 
-Add = NT("Add")
-Factor = NT("Factor")
-Term = NT("Term")
+Expr = NT("Expr")
 class ParserMath(Parser):
-	START = Add
-	@production(Add, "+", Factor, out=Add)
-	def _(a, _1, f):
-		return a, "+", f
-	@production(Add, "-", Factor, out=Add)
-	def _(a, _1, f):
-		return a, "-", f
-	@production(Factor, "*", Term, out=Factor)
-	def _(f, _1, t):
-		return f, "*", t
-	@production(Factor, "/", Term, out=Factor)
-	def _(f, _1, t):
-		return f, "/", t
-	@production("(", Add, ")", out=Term)
-	def _(_1, a, _2):
-		return a
-	@production("num", out=Term)
-	def _(_1):
-		return _1
-	@production("-", Term, out=Term)
-	def _(_1, t):
-		if isinstance(t, float):
-			return -t
-		return ("-", t)
-	@production("+", Term, out=Term)
-	def _(_1, t):
-		return t
-	@production(Factor, out=Add)
-	def _(_1):
-		return _1
-	@production(Term, out=Factor)
+	START = Expr
+	ALGORITHM = "lalr"
+	PRECEDENCE = (
+		("left", "+", "-"),
+		("left", "*", "/"),
+		("right", "UNARY"),
+	)
+	@production(Expr, "+", Expr, out=Expr)
+	def _(a, _1, b):
+		return a, "+", b
+	@production(Expr, "-", Expr, out=Expr)
+	def _(a, _1, b):
+		return a, "-", b
+	@production(Expr, "*", Expr, out=Expr)
+	def _(a, _1, b):
+		return a, "*", b
+	@production(Expr, "/", Expr, out=Expr)
+	def _(a, _1, b):
+		return a, "/", b
+	@production("(", Expr, ")", out=Expr)
+	def _(_1, e, _2):
+		return e
+	@production("num", out=Expr)
 	def _(_1):
 		return _1
+	@production("-", Expr, out=Expr, prec="UNARY")
+	def _(_1, e):
+		if isinstance(e, float):
+			return -e
+		return ("-", e)
+	@production("+", Expr, out=Expr, prec="UNARY")
+	def _(_1, e):
+		return e
 
 
 if __name__ == "__main__":
@@ -12,10 +12,10 @@ def hasmethod(obj, method):
 	return hasattr(obj, method) and callable(getattr(obj, method))
 
 
-def compile(text, Lexer, parser, verbose=False, timed=False):
+def compile(source, parser, verbose=False, timed=False):
 	global lexer
 	t = time()
-	lexer = Lexer(text)
+	lexer = source
 	tokens, error = lexer.tokens()
 	if timed:
 		print("Lexer:", time()-t)
@@ -46,10 +46,10 @@ def main(path, files, verbose=False, immediate=False, timed=False):
 	grammar = SourceFileLoader("grammar", path+"__init__.py").load_module()
 	parser = grammar.GParser()
 	for unit in files:
-		text = open(unit, "r").read()
-		print(text)
+		source = grammar.GLexer.from_file(unit)
+		print(source.slice(0, len(source.text)))
 		parser = grammar.GParser()
-		result = compile(text, grammar.GLexer, parser, verbose, timed)
+		result = compile(source, parser, verbose, timed)
 	if immediate:
 		return grammar
 	text = ""
@@ -63,7 +63,7 @@ def main(path, files, verbose=False, immediate=False, timed=False):
 			elif entry == "QUIT":
 				return grammar
 			continue
-		result = compile(text, grammar.GLexer, parser, verbose)
+		result = compile(grammar.GLexer(text), parser, verbose)
 		parser = parser
 		text = ""
 		print("")
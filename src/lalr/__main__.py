@@ -0,0 +1,68 @@
+import os
+import sys
+from argparse import ArgumentParser
+from importlib.util import spec_from_file_location, module_from_spec
+from pprint import pformat
+from .lexer import Lexer, BackendGraph
+from .parser import Parser
+
+
+HEADER = '''"""Tables generated by `python -m lalr compile {}`, do not edit"""
+
+'''
+
+
+def load_grammar(path):
+	path = os.path.abspath(path)
+	if os.path.isdir(path):
+		name = os.path.basename(path)
+		spec = spec_from_file_location(name, os.path.join(path, "__init__.py"), submodule_search_locations=[path])
+	else:
+		name = os.path.splitext(os.path.basename(path))[0]
+		spec = spec_from_file_location(name, path)
+	sys.path.insert(0, os.path.dirname(path))
+	module = module_from_spec(spec)
+	sys.modules[name] = module
+	spec.loader.exec_module(module)
+	return module
+
+
+def grammar_classes(module, base):
+	result = []
+	for value in vars(module).values():
+		if isinstance(value, type) and issubclass(value, base) and value is not base and value not in result:
+			result.append(value)
+	return result
+
+
+def compile(path, output=None):
+	module = load_grammar(path)
+	parsers = {}
+	for parser in grammar_classes(module, Parser):
+		parsers[parser.__name__] = (parser.fingerprint(), parser.dump())
+	graphs = {}
+	for lexer in grammar_classes(module, Lexer):
+		if lexer.backend is BackendGraph:
+			graphs[lexer.__name__] = (BackendGraph.fingerprint(lexer), lexer.GRAPH.dump())
+	if output is None:
+		output = os.path.basename(os.path.normpath(path)).partition(".")[0]+"_tables.py"
+	with open(output, "w") as file:
+		file.write(HEADER.format(path))
+		file.write(f"PARSER = {pformat(parsers, compact=True, width=120)}\n\n")
+		file.write(f"GRAPH = {pformat(graphs, compact=True, width=120)}\n")
+	return output
+
+
+def main(argv=None):
+	arguments = ArgumentParser(prog="python -m lalr")
+	commands = arguments.add_subparsers(dest="command", required=True)
+	command = commands.add_parser("compile", help="generate a standalone tables module for a grammar")
+	command.add_argument("grammar", help="grammar package directory or module file")
+	command.add_argument("-o", "--output", help="path of the generated module")
+	args = arguments.parse_args(argv)
+	if args.command == "compile":
+		print(compile(args.grammar, args.output))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,54 @@
+import os
+import pickle
+from importlib import import_module
+from hashlib import sha256
+from . import __version__
+
+
+DIRECTORY = os.environ.get("LALR_CACHE_DIR")
+FORMAT = 6
+
+
+def fingerprint(*parts):
+	return sha256(repr((__version__, FORMAT)+parts).encode()).hexdigest()
+
+
+def path(directory, kind, key):
+	return os.path.join(directory, f"{kind}-{key}.pickle")
+
+
+def load(directory, kind, key):
+	if directory is None:
+		return None
+	try:
+		with open(path(directory, kind, key), "rb") as file:
+			return pickle.load(file)
+	except (OSError, EOFError, pickle.UnpicklingError):
+		return None
+
+
+def store(directory, kind, key, data):
+	if directory is None:
+		return
+	target = path(directory, kind, key)
+	tmp = f"{target}.{os.getpid()}"
+	try:
+		os.makedirs(directory, exist_ok=True)
+		with open(tmp, "wb") as file:
+			pickle.dump(data, file)
+		os.replace(tmp, target)
+	except OSError:
+		pass
+
+
+def find(tables, kind, name, key):
+	"""Entry of an ahead-of-time generated tables module, None if it is
+	missing or was generated from a different grammar"""
+	if tables is None:
+		return None
+	if isinstance(tables, str):
+		tables = import_module(tables)
+	entry = getattr(tables, kind.upper(), {}).get(name)
+	if entry is None or entry[0] != key:
+		return None
+	return entry[1]
@@ -0,0 +1,137 @@
+from .lrk import EOF, unexpected
+from .errors import Illegal_Token, ParserError
+
+
+class Accept(Exception):
+	pass
+
+
+class Unexpected(Exception):
+	pass
+
+
+def terminal(token, names):
+	"""Test of the token type t against token"""
+	if token is EOF:
+		return "t is EOF"
+	if isinstance(token, str):
+		return f"t == {token!r}"
+	return f"t == {names.setdefault(token, f'T{len(names)}')}"
+
+
+def condition(tokens, names):
+	if len(tokens) > 3 and all(isinstance(token, str) for token in tokens):
+		return "t in {"+", ".join(map(repr, tokens))+"}"
+	return " or ".join(terminal(token, names) for token in tokens)
+
+
+def goto(table, product, gotos):
+	"""Target of the product from the exposed state, a constant when all
+	the states share it, otherwise a lookup in the G<product> dict"""
+	if product not in gotos:
+		targets = {}
+		for state in range(len(table)):
+			i = table.goto_base[state]+product
+			if table.goto_check[i] == state:
+				targets[state] = table.goto_value[i]
+		if len(set(targets.values())) == 1:
+			gotos[product] = (str(*set(targets.values())), None)
+		else:
+			gotos[product] = (f"G{product}[{{}}]", targets)
+	return gotos[product][0]
+
+
+def reduction(table, rule, gotos):
+	"""Statements reducing rule, the semantic action is called directly and
+	skipped for the identity unit productions"""
+	length, product = table.lengths[rule], table.products[rule]
+	method = table.methods[rule]
+	target = goto(table, product, gotos)
+	if length == 0:
+		return [f"values.append(m{rule}(ctx))", f"states.append({target.format('states[-1]')})"]
+	lines = []
+	if not (length == 1 and getattr(method, "identity", False)):
+		args = ", ".join(f"values[{i-length}]" for i in range(length))
+		lines.append(f"values[{-length}] = m{rule}(ctx, {args})")
+		if length > 1:
+			lines.append(f"del values[{1-length}:]")
+	if length > 1:
+		lines.append(f"del states[{1-length}:]")
+	lines.append(f"states[-1] = {target.format('states[-2]')}")
+	return lines
+
+
+def generate(table):
+	"""Python source of one handler function per state. A handler performs
+	one step for the current token: it returns True after a shift and False
+	after a reduction, and raises Accept or Unexpected"""
+	names = {}
+	gotos = {}
+	code = []
+	for state in range(len(table)):
+		code.append(f"def s{state}(ctx, states, values, token):")
+		if table.default[state]:
+			code.extend(f"\t{line}" for line in reduction(table, -1-table.default[state], gotos))
+			code.append("\treturn False")
+			code.append("")
+			continue
+		actions = {}
+		for token in table.terminals:
+			action = table.action(state, token)
+			if action is not None:
+				actions.setdefault(action, []).append(token)
+		if actions:
+			code.append("\tt = token.type")
+		for action, tokens in actions.items():
+			code.append(f"\tif {condition(tokens, names)}:")
+			if action > 0:
+				code.append(f"\t\tstates.append({action-1})")
+				code.append("\t\tvalues.append(token.value)")
+				code.append("\t\treturn True")
+			elif action == table.accept:
+				code.append("\t\traise ACCEPT")
+			else:
+				code.extend(f"\t\t{line}" for line in reduction(table, -1-action, gotos))
+				code.append("\t\treturn False")
+		code.append("\traise UNEXPECTED")
+		code.append("")
+	for product, (_, targets) in sorted(gotos.items()):
+		if targets is not None:
+			code.append(f"G{product} = {targets!r}")
+	code.append(f"HANDLERS = [{', '.join(f's{state}' for state in range(len(table)))}]")
+	symbols = [(name, token) for token, name in names.items()]
+	return "\n".join(code)+"\n", symbols
+
+
+def load(source, symbols, table, name="<parser>"):
+	"""Compile a generated source, binding the semantic actions of table"""
+	namespace = {"EOF": EOF, "ACCEPT": Accept, "UNEXPECTED": Unexpected}
+	namespace.update({f"m{rule}": method for rule, method in enumerate(table.methods)})
+	namespace.update(symbols)
+	exec(compile(source, name, "exec"), namespace)
+	return namespace["HANDLERS"]
+
+
+def parse(handlers, table, tokens, lexer, ctx):
+	states = [0]
+	values = []
+	last_valid = 0
+	last_token = None
+	try:
+		tokens = iter(tokens)
+		token = next(tokens, None)
+		while token is not None:
+			current = token
+			if handlers[states[-1]](ctx, states, values, token):
+				last_valid = states[-1]
+				token = next(tokens, None)
+			last_token = current
+	except Accept:
+		return values[0], None
+	except Unexpected:
+		return None, unexpected(table, last_valid, token, lexer).format_error()
+	except ParserError as error:
+		return None, Illegal_Token(str(error), lexer.file_name, lexer.text, last_token).format_error()
+	except Illegal_Token as error:
+		return None, error.format_error()
+	return None, None
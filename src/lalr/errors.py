@@ -1,19 +1,43 @@
 TAB = "  "
 SPACES_IN_TAB = 4
+def get_line(data, start):
+	"""Bytes of the line of binary data starting at start"""
+	if hasattr(data, "find"):
+		end = data.find(b"\n", start)
+		return bytes(data[start:end if end >= 0 else len(data)])
+	line, _, _ = bytes(data[start:]).partition(b"\n")
+	return line
+
+
 class Illegal_Token(Exception):
-	def __init__(self, msg, file_name, text, pos, size=None, note=None):
+	def __init__(self, msg, file_name, text, pos, size=None, note=None, offset=0, encoding="utf-8"):
 		self.msg = msg.replace("\t", TAB)
 		self.file_name = file_name
 		self.text = text
 		self.pos = pos
 		self.size = max(1, pos.pos_end-pos.pos) if size is None else size
 		self.note = note
+		self.offset = offset
+		self.encoding = encoding
 
 	def format_error(self):
-		line, *_ = self.text[self.pos.pos_nl:].partition("\n")
-		pos_ln = self.pos.pos-self.pos.pos_nl
-		tabs = line[:pos_ln].count("\t")
-		padding = pos_ln + tabs*(SPACES_IN_TAB-1)
+		"""Message with the line of the error, from the start of the kept
+		text when the beginning of the line was dropped"""
+		start = max(self.pos.pos_nl, self.offset)
+		pos_ln = max(0, self.pos.pos-start)
+		start -= self.offset
+		if isinstance(self.text, str):
+			end = self.text.find("\n", start)
+			line = self.text[start:end if end >= 0 else len(self.text)]
+			before = line[:pos_ln]
+		else:
+			line = get_line(self.text, start)
+			before = str(line[:pos_ln], self.encoding, "replace")
+			line = str(line, self.encoding, "replace")
+		if self.pos.pos_nl < self.offset:
+			line, before = "..."+line, "..."+before
+		tabs = before.count("\t")
+		padding = len(before) + tabs*(SPACES_IN_TAB-1)
 		line = line.replace("\t", " "*SPACES_IN_TAB)
 		result = f"""
 {TAB}File "{self.file_name}", line {self.pos.line}
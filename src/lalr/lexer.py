@@ -1,6 +1,10 @@
-from .lrk import EOF
+from .lrk import EOF, Constant
 from .errors import Illegal_Token
-from .regex import RegexGraph, to_ascii, parse_regex
+from .regex import RegexGraph, parse_regex, supported
+from . import cache
+from operator import itemgetter
+import codecs
+import mmap
 import re
 
 
@@ -23,20 +27,29 @@ class Token:
 		return self.__repr__()
 
 
+HOLD = Constant("hold")
 DEFAULT_PRIORITY = 0
-def token(pattern, priority=DEFAULT_PRIORITY):
+def token(pattern, priority=DEFAULT_PRIORITY, type=None):
+	"""With a type, the decorated function only converts the value of the
+	token and is skipped by lexers created with convert=False"""
 	class deco:
 		def __init__(self, f):
 			if f.__code__.co_argcount != 2:
 				raise ValueError("Token decorator must take exactly 2 arguments")
-			def wrapper(lexer, val):
-				result = f(lexer, val)
-				if result is None:
-					return None
-				elif isinstance(result, tuple):
-					return Token(result[0], result[1], lexer)
-				else:
-					return Token(result, result, lexer)
+			if type is None:
+				def wrapper(lexer, val):
+					result = f(lexer, val)
+					if result is None:
+						return None
+					elif isinstance(result, tuple):
+						return Token(result[0], result[1], lexer)
+					else:
+						return Token(result, result, lexer)
+			else:
+				def wrapper(lexer, val):
+					if lexer.convert:
+						val = f(lexer, val)
+					return Token(val, type, lexer)
 			entry = (pattern, wrapper, priority)
 			token.entries.append(entry)
 
@@ -56,6 +69,9 @@ token.entries = []
 class Lexer:
 	ENTRIES = None
 	BACKEND = "re"
+	WINDOW = 256
+	CACHE = cache.DIRECTORY
+	TABLES = None
 	@classmethod
 	def build(cls):
 		if cls.ENTRIES is None:
@@ -66,58 +82,122 @@ class Lexer:
 			else:
 				cls.ENTRIES[i] = cls.expand(entry)
 		cls.ENTRIES.sort(key=lambda entry:-entry[2])
-		cls.backend = BackendGraph if cls.BACKEND == "graph" else BackendRe
+		cls.backend = BACKENDS.get(cls.BACKEND, BackendRe)
 		cls.backend.build(cls)
 
 	@classmethod
 	def expand(cls, pattern, wrapper=None, priority=DEFAULT_PRIORITY):
 		if wrapper is None:
+			literal = pattern
 			pattern = re.escape(pattern)
 			type = wrapper
 			wrapper = lambda lexer, x: Token(x, type, lexer)
+			wrapper.literal = literal
 		return pattern, wrapper, priority
 
-	def __init__(self, text, file_name="<stdin>"):
+	def __init__(self, text, file_name="<stdin>", convert=True, encoding="utf-8"):
 		self.file_name = file_name
+		self.convert = convert
 		self.text = text
-		self.view = text
+		self.binary = not isinstance(text, str)
+		self.encoding = encoding
 		self.line = 1
 		self.pos = 0
 		self.pos_nl = 0
 		self.pos_end = 0
+		self.offset = 0
+		self.mark = 0
+		self.run = None
 		self.backend.init(self)
 
-	def advance(self, token):
-		n = len(token)
-		self.view = self.view[n:]
-		self.pos += n
+	@classmethod
+	def from_file(cls, path, convert=True, encoding="utf-8"):
+		"""Lexer of a memory mapped file, lexed in place and decoded token by
+		token"""
+		with open(path, "rb") as file:
+			try:
+				data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+			except ValueError:
+				data = b""
+		return cls(data, path, convert, encoding)
+
+	def advance(self, token, size):
 		n = token.count("\n")
 		if n:
 			self.line += n
-			after, _, before = token[::-1].partition("\n")
-			self.pos_nl = self.pos - len(after)
+			tail = token[token.rfind("\n")+1:]
+			self.pos_nl = self.pos+size-(len(tail.encode(self.encoding)) if self.binary else len(tail))
+		self.pos += size
+
+	def slice(self, start, end, errors="strict"):
+		"""Text between two indexes of the kept text, decoded if binary"""
+		if self.binary:
+			return str(self.text[start:end], self.encoding, errors)
+		return self.text[start:end]
+
+	def iter_tokens(self):
+		"""Lazily yield the tokens of the text, ending with EOF. Raises
+		Illegal_Token on the first illegal character"""
+		return self.scan(True)
+
+	def scan(self, final):
+		"""Yield the tokens of the remaining text. Unless final, a token that
+		more text could change is held back until the next chunk"""
+		while self.pos < self.offset+len(self.text):
+			result = self.backend.get_token(self) if final else self.backend.get_partial(self)
+			if result is HOLD:
+				return
+			start = self.pos-self.offset
+			if result is None:
+				self.raise_error(f'Illegal character: "{self.slice(start, start+1, "replace")}"')
+			end, wrapper = result
+			token = self.slice(start, end)
+			self.pos_end += end-start
+			result = wrapper(self, token)
+			self.advance(token, end-start)
+			if result is not None:
+				self.mark = max(result.pos_nl, result.pos-self.WINDOW)
+				yield result
+		if final:
+			yield Token(EOF, lexer=self)
+
+	def feed(self, chunk, final=False):
+		"""Append chunk to the text and yield the tokens completed by it, with
+		final the remaining tokens and EOF. Only the text from the line of the
+		last token yielded is kept for error messages, at most WINDOW
+		characters before it"""
+		drop = self.mark-self.offset
+		self.text = self.text[drop:]+chunk
+		self.offset = self.mark
+		self.backend.append(self, chunk, drop)
+		return self.scan(final)
+
+	async def aiter_tokens(self, reader, every=1000, size=1<<16, encoding="utf-8"):
+		"""Asynchronously yield the tokens read from an asyncio.StreamReader,
+		ending with EOF. Gives control back to the event loop every few tokens"""
+		import asyncio
+		decoder = codecs.getincrementaldecoder(encoding)()
+		count = 0
+		final = False
+		while not final:
+			data = await reader.read(size)
+			final = not data
+			for token in self.feed(decoder.decode(data, final), final):
+				yield token
+				count += 1
+				if count == every:
+					count = 0
+					await asyncio.sleep(0)
 
 	def tokens(self):
-		stream = []
 		try:
-			while self.view:
-				result = self.backend.get_token(self)
-				if result is None:
-					print(stream)
-					self.raise_error(f'Illegal character: "{self.text[self.pos]}"')
-				token, wrapper = result
-				self.pos_end += len(token)
-				result = wrapper(self, token)
-				self.advance(token)
-				if result is not None:
-					stream.append(result)
-			stream.append(Token(EOF, lexer=self))
+			stream = list(self.iter_tokens())
 		except Illegal_Token as error:
 			return None, error.format_error()
 		return stream, None
 
 	def raise_error(self, msg, size=1, note=None):
-		raise Illegal_Token(msg, self.file_name, self.text, self, size, note)
+		raise Illegal_Token(msg, self.file_name, self.text, self, size, note, self.offset, self.encoding)
 
 	def __repr__(self):
 		return "\n".join(f"- {pattern}, {priority}" for pattern, wrapper, priority in self.ENTRIES)
@@ -127,6 +207,10 @@ class Lexer:
 
 
 class Backend:
+	"""The regex backends find whether a token can change with more text on
+	the graph of their patterns, built on the first chunk fed. When a pattern
+	is not supported by parse_regex, a token is held back while its match
+	reaches the end of the text or less than WINDOW characters follow it"""
 	@staticmethod
 	def build(lexer):
 		pass
@@ -134,43 +218,158 @@ class Backend:
 	def init(lexer):
 		pass
 	@staticmethod
+	def append(lexer, chunk, drop):
+		Lexer = type(lexer)
+		if "GRAPH" not in vars(Lexer):
+			Lexer.GRAPH = None
+			if all(supported(entry[0]) for entry in Lexer.ENTRIES):
+				BackendGraph.build(Lexer)
+		if lexer.GRAPH is None:
+			return
+		codes = getattr(lexer, "codes", None)
+		if codes is None:
+			lexer.codes = bytearray(lexer.GRAPH.classify(lexer.text))
+		else:
+			del codes[:drop]
+			codes += lexer.GRAPH.classify(chunk)
+	@staticmethod
 	def get_token(lexer):
 		pass
+	@staticmethod
+	def get_partial(lexer):
+		"""Token at lexer.pos like get_token, HOLD when more text could change
+		it. The graph resumes from the end of the text it reached"""
+		start = lexer.pos-lexer.offset
+		if lexer.GRAPH is None:
+			if len(lexer.text)-start < lexer.WINDOW:
+				return HOLD
+		else:
+			run = lexer.run[1] if lexer.run is not None and lexer.run[0] == lexer.pos else None
+			_, _, run = lexer.GRAPH.scan(lexer.codes, start, None, run)
+			lexer.run = None if run is None else (lexer.pos, run)
+			if run is not None:
+				return HOLD
+		result = lexer.backend.get_token(lexer)
+		if result is not None and result[0] == len(lexer.text):
+			return HOLD
+		return result
 
 
 class BackendRe(Backend):
 	@staticmethod
 	def init(lexer):
-		lexer.ENTRIES = [(re.compile(pattern, re.DOTALL), wrapper, priority) for pattern, wrapper, priority in lexer.ENTRIES]
+		encode = (lambda pattern: pattern.encode(lexer.encoding)) if lexer.binary else str
+		lexer.ENTRIES = [(re.compile(encode(pattern), re.DOTALL), wrapper, priority) for pattern, wrapper, priority in lexer.ENTRIES]
 
 	@staticmethod
 	def get_token(lexer):
 		current = None
 		for pattern, wrapper, priority in lexer.ENTRIES:
-			m = pattern.match(lexer.view)
+			m = pattern.match(lexer.text, lexer.pos-lexer.offset)
 			if m and (current is None or current[0].end() < m.end()):
 				current = (m, wrapper)
 		if current is None:
 			return current
 		m, wrapper = current
-		return m.group(), wrapper
+		return m.end(), wrapper
+
+
+class BackendMaster(Backend):
+	"""All the patterns in a single regex, each in a lookahead capturing its
+	match, with a single call to the regex engine per token. The longest
+	match of highest priority is found from the spans of the captures.
+	Consecutive plain text entries of equal priority share one lookahead,
+	longest first, and are told apart by their text"""
+	@staticmethod
+	def build(lexer):
+		choices = []
+		for i, (pattern, wrapper, priority) in enumerate(lexer.ENTRIES):
+			literal = getattr(wrapper, "literal", None)
+			if literal is None:
+				choices.append((pattern, i))
+			elif choices and isinstance(choices[-1][1], dict) and choices[-1][0] == priority:
+				choices[-1][1].setdefault(literal, i)
+			else:
+				choices.append((priority, {literal: i}))
+		groups = []
+		parts = []
+		count = 1
+		for pattern, choice in choices:
+			if isinstance(choice, dict):
+				pattern = "|".join(map(re.escape, sorted(choice, key=len, reverse=True)))
+			groups.append(count)
+			parts.append(f"(?:(?=({pattern}))|)")
+			count += 1+re.compile(pattern).groups
+		lexer.MASTER = re.compile("".join(parts), re.DOTALL)
+		lexer.SPANS = itemgetter(*groups) if len(groups) > 1 else lambda regs: tuple(regs[group] for group in groups)
+		lexer.CHOICES = [choice for _, choice in choices]
+
+	@staticmethod
+	def init(lexer):
+		if lexer.binary:
+			lexer.MASTER = re.compile(lexer.MASTER.pattern.encode(lexer.encoding), re.DOTALL)
+			lexer.CHOICES = [{literal.encode(lexer.encoding): i for literal, i in choice.items()} if isinstance(choice, dict) else choice for choice in lexer.CHOICES]
+
+	@staticmethod
+	def get_token(lexer):
+		start = lexer.pos-lexer.offset
+		spans = lexer.SPANS(lexer.MASTER.match(lexer.text, start).regs)
+		best = max(spans, default=(-1, -1))
+		if best[0] < 0:
+			return None
+		choice = lexer.CHOICES[spans.index(best)]
+		if isinstance(choice, dict):
+			choice = choice[lexer.text[start:best[1]]]
+		return best[1], lexer.ENTRIES[choice][1]
 
 
 class BackendGraph(Backend):
+	@staticmethod
+	def fingerprint(lexer):
+		return cache.fingerprint([entry[0] for entry in lexer.ENTRIES])
+
 	@staticmethod
 	def build(lexer):
+		key = BackendGraph.fingerprint(lexer)
+		data = cache.find(lexer.TABLES, "graph", lexer.__name__, key) or cache.load(lexer.CACHE, "graph", key)
+		if data is not None:
+			lexer.GRAPH = RegexGraph.load(data)
+			return
 		lexer.GRAPH = RegexGraph(*[parse_regex(entry[0]) for entry in lexer.ENTRIES])
 		lexer.GRAPH.compile()
+		cache.store(lexer.CACHE, "graph", key, lexer.GRAPH.dump())
 
 	@staticmethod
 	def init(lexer):
-		lexer.view = to_ascii(lexer.view)
+		if lexer.binary:
+			lexer.codes = lexer.text
+			lexer.classes = lexer.GRAPH.byte_classes
+		else:
+			lexer.codes = lexer.GRAPH.classify(lexer.text)
+			lexer.classes = None
+
+	@staticmethod
+	def append(lexer, chunk, drop):
+		codes = lexer.codes
+		if not isinstance(codes, bytearray):
+			codes = lexer.codes = bytearray(codes)
+		del codes[:drop]
+		codes += lexer.GRAPH.classify(chunk)
 
 	@staticmethod
 	def get_token(lexer):
-		m = lexer.GRAPH.match(lexer.view)
-		if m is None:
-			return m
-		token = lexer.text[lexer.pos:lexer.pos+m.length]
-		wrapper = lexer.ENTRIES[m.families[0].id][1]
-		return token, wrapper
+		start = lexer.pos-lexer.offset
+		run = lexer.run[1] if lexer.run is not None and lexer.run[0] == lexer.pos else None
+		length, family, run = lexer.GRAPH.scan(lexer.codes, start, lexer.classes, run)
+		lexer.run = None if run is None else (lexer.pos, run)
+		if family < 0:
+			return None
+		return start+length, lexer.ENTRIES[family][1]
+
+	@staticmethod
+	def get_partial(lexer):
+		result = BackendGraph.get_token(lexer)
+		return result if lexer.run is None else HOLD
+
+
+BACKENDS = {"re": BackendRe, "master": BackendMaster, "graph": BackendGraph}
@@ -1,4 +1,6 @@
-from .utils import Set, enum_list
+from .utils import Set, MultiDict, enum_list
+from array import array
+from time import perf_counter
 from .errors import Illegal_Token, ParserError
 
 
@@ -34,11 +36,17 @@ class Constant:
 
 EOF = Constant("$")
 ACCEPT = Constant("@")
+SHIFT = Constant("shift")
+REDUCE = Constant("reduce")
+ERROR = Constant("error")
+# initial size of the preallocated stacks, doubled when full
+STACK = 64
 
 
 class Rules(dict):
 	def __init__(self, *rules):
 		super().__init__()
+		self.precedence = {}
 		self.add_rules(*rules)
 
 	def add_rule(self, product, tokens, method=None, follow=None):
@@ -52,37 +60,122 @@ class Rules(dict):
 		for rule in rules:
 			self.add_rule(*rule)
 
-	def follow(self):
-		dirty = False
+	def add_precedence(self, *levels):
+		"""yacc style precedence levels, from lowest to highest, each given as
+		("left" | "right" | "nonassoc", *tokens)"""
+		for associativity, *tokens in levels:
+			if associativity not in ("left", "right", "nonassoc"):
+				raise ValueError(f"Unknown associativity: {associativity}")
+			level = 1+max((level for level, _ in self.precedence.values()), default=-1)
+			for token in tokens:
+				self.precedence[token] = (level, associativity)
+
+	def resolve(self, entry, token):
+		"""Resolution of a shift/reduce conflict between entry and token, None
+		if either has no precedence. entry takes the precedence of its
+		rightmost terminal unless it was given one with prec"""
+		prec = getattr(entry.method, "prec", None)
+		if prec is None:
+			for prec in reversed(entry.tokens):
+				if not isinstance(prec, NT):
+					break
+			else:
+				return None
+		if prec not in self.precedence or token not in self.precedence:
+			return None
+		rule_level, _ = self.precedence[prec]
+		token_level, associativity = self.precedence[token]
+		if token_level != rule_level:
+			return SHIFT if token_level > rule_level else REDUCE
+		return {"left": REDUCE, "right": SHIFT, "nonassoc": ERROR}[associativity]
+
+	def analyse(self):
+		"""Compute NULLABLE, FIRST and FOLLOW sets with dependency worklists,
+		a symbol is only revisited when one of its inputs changed"""
+		waiting = MultiDict()
+		counts = {}
+		queue = []
 		for rule in self.values():
 			for entry in rule.entries:
-				tokens = entry.tokens
-				if len(tokens) == 0:
+				if any(not isinstance(token, NT) for token in entry.tokens):
 					continue
-				end = tokens[-1]
-				if isinstance(end, NT):
-					dirty = self[end].follow.update(rule.follow) or dirty
-				for i, token in enumerate(tokens[1:]):
-					nt = tokens[i]
-					if isinstance(nt, NT):
-						if isinstance(token, NT):
-							dirty = self[nt].follow.update(self[token].first) or dirty
-						else:
-							dirty = self[nt].follow.add(token) or dirty
-		return dirty
-
-	def first(self):
-		dirty = False
+				counts[entry] = entry.length
+				for token in entry.tokens:
+					waiting.put(token, entry)
+				if entry.length == 0 and not rule.nullable:
+					rule.nullable = True
+					queue.append(rule.product)
+		while queue:
+			for entry in waiting.get(queue.pop(), ()):
+				counts[entry] -= 1
+				rule = self[entry.product]
+				if counts[entry] == 0 and not rule.nullable:
+					rule.nullable = True
+					queue.append(rule.product)
+
+		first_deps = MultiDict()
+		follow_deps = MultiDict()
 		for rule in self.values():
 			for entry in rule.entries:
-				if len(entry.tokens) == 0:
-					continue
-				first = entry.tokens[0]
-				if isinstance(first, NT):
-					dirty = rule.first.update(self[first].first) or dirty
-				else:
-					dirty = rule.first.add(first) or dirty
-		return dirty
+				tokens = entry.tokens
+				for token in tokens:
+					if not isinstance(token, NT):
+						rule.first.add(token)
+						break
+					first_deps.put(token, rule.product)
+					if not self[token].nullable:
+						break
+				for i, token in enumerate(tokens):
+					if not isinstance(token, NT):
+						continue
+					follow = self[token].follow
+					for next in tokens[i+1:]:
+						if not isinstance(next, NT):
+							follow.add(next)
+							break
+						follow_deps.put(("first", next), token)
+						if not self[next].nullable:
+							break
+					else:
+						follow_deps.put(("follow", rule.product), token)
+
+		queue = list(self.keys())
+		while queue:
+			product = queue.pop()
+			first = self[product].first
+			for other in first_deps.get(product, ()):
+				if self[other].first.update(first):
+					queue.append(other)
+		for (kind, product), others in follow_deps.items():
+			if kind == "first":
+				for other in others:
+					self[other].follow.update(self[product].first)
+		queue = list(self.keys())
+		while queue:
+			product = queue.pop()
+			follow = self[product].follow
+			for other in follow_deps.get(("follow", product), ()):
+				if self[other].follow.update(follow):
+					queue.append(other)
+
+	def first_of(self, tokens):
+		"""FIRST set of a sequence of tokens and whether it is nullable"""
+		first = Set()
+		for token in tokens:
+			if not isinstance(token, NT):
+				first.add(token)
+				return first, False
+			rule = self[token]
+			first.update(rule.first)
+			if not rule.nullable:
+				return first, False
+		return first, True
+
+	def entries(self):
+		return [entry for rule in self.values() for entry in rule.entries]
+
+	def actions(self):
+		return [entry.action() for entry in self.entries()]
 
 	def __repr__(self):
 		return "\n".join(str(rule) for rule in self.values())
@@ -103,6 +196,9 @@ class RuleEntry:
 	def action(self):
 		return self.product, self.length, self.method
 
+	def __repr__(self):
+		return f"{self.product} -> "+" ".join(str(token) for token in self.tokens)
+
 
 class Rule:
 	def __init__(self, product, entry=None, follow=None):
@@ -110,6 +206,7 @@ class Rule:
 		self.entries = [] if entry is None else [entry]
 		self.follow = Set() if follow is None else Set(follow)
 		self.first = Set()
+		self.nullable = False
 
 	def __repr__(self):
 		return f"{self.product} -> "+f"\n{' '*len(self.product)}  > ".join(
@@ -154,6 +251,9 @@ class State(dict):
 	def can_merge(self, other):
 		return self.keys() == other.keys()
 
+	def key(self):
+		return frozenset((key, frozenset(position.look)) for key, position in self.items())
+
 	def entail(self, rules):
 		dirty = False
 		new = []
@@ -165,48 +265,71 @@ class State(dict):
 			at = position.at()
 			if isinstance(at, NT):
 				rule = rules[at]
-				if position.on_last():
-					#next = position.look
-					next = rule.follow
-					#next = rules[position.product].follow
-					#print(position)
-					#print(" ", position.look)
-					#print(at, rule.follow)
-					#print(position.product, rules[position.product].follow)
-					#print("---")
-				elif isinstance(position.next(), NT):
-					next = rules[position.next()].first
-				else:
-					next = [position.next()]
+				next, nullable = rules.first_of(position.entry.tokens[position.position+1:])
+				if nullable:
+					next.update(rule.follow)
 				new.append((rule, next))
 		for rule, next in new:
 			self.add_rule(rule, next)
 		return dirty
 
-	def tree(self):
-		shift = {}
+	def close(self, rules):
+		"""LR(0) closure, lookaheads are left empty"""
+		todo = list(self.values())
+		while todo:
+			position = todo.pop()
+			if position.on_end():
+				continue
+			at = position.at()
+			if isinstance(at, NT):
+				for i, entry in enumerate(rules[at].entries):
+					key = ((at, i), 0)
+					if key not in self:
+						self.add_position((at, i), at, entry)
+						todo.append(self[key])
+
+	def reductions(self, shift, rules):
+		"""Reductions of the state, shift/reduce conflicts with shift are
+		resolved by precedence when possible. A token made an error by a
+		nonassoc precedence stays one"""
 		reduce = {}
+		error = set()
 		for position in self.values():
-			if position.on_end():
-				for at in position.look:
-					if at in reduce:
-						print("reduce/reduce conflict:", at, "(", position, ")")
+			if not position.on_end():
+				continue
+			for at in position.look:
+				if at in error:
+					continue
+				if at in reduce:
+					print("reduce/reduce conflict:", at, "(", position, ")")
+					print(self)
+					input()
+					continue
+				if at in shift:
+					choice = rules.resolve(position.entry, at)
+					if choice is None:
+						print("shift/reduce conflict:", at)
 						print(self)
 						input()
-					else:
-						reduce[at] = position.entry.action()
-			else:
+					elif choice == SHIFT:
+						continue
+					del shift[at]
+					if choice == ERROR:
+						error.add(at)
+						continue
+				reduce[at] = position.entry.action()
+		return reduce
+
+	def tree(self, rules):
+		shift = {}
+		for position in self.values():
+			if not position.on_end():
 				at = position.at()
 				if at in shift:
 					shift[at].add_position(*position.advance())
 				else:
 					shift[at] = State(position.advance())
-		for at in reduce.keys():
-			if at in shift:
-				del shift[at]
-				print("shift/reduce conflict:", at)
-				print(self)
-				input()
+		reduce = self.reductions(shift, rules)
 		return shift, reduce
 
 	def __repr__(self):
@@ -272,18 +395,18 @@ def group(goto):
 	return result
 
 
-def unroll(rules, start, minify=False):
+def unroll(rules, start, minify=False, stats=None):
 	accept = NT("__ACCEPT__")
 	rules.add_rule(accept, [start, EOF])
 	origin = State()
 	origin.add_rule(rules[accept])
 
-	closure(rules.first)
-	closure(rules.follow)
+	rules.analyse()
 
 	goto = {}
 	merge = {}
 	states = {}
+	index = {}
 	stack = [[origin]]
 
 	while stack:
@@ -292,16 +415,17 @@ def unroll(rules, start, minify=False):
 			closure(state.entail, args=(rules,))
 			debug("===============================================")
 			debug(state)
-			for other in states.values():
-				if state == other:
-					debug("merging", state.id, other.id)
-					merge[state.id] = other.id
-					break
+			key = state.key()
+			other = index.get(key)
+			if other is not None:
+				debug("merging", state.id, other.id)
+				merge[state.id] = other.id
 			else:
+				index[key] = state
 				states[state.id] = state
 				merge[state.id] = state.id
 
-				shift, reduce = state.tree()
+				shift, reduce = state.tree(rules)
 				stack.append(list(shift.values()))
 				l = len(stack)
 				for k, v in shift.items():
@@ -323,14 +447,14 @@ def unroll(rules, start, minify=False):
 		stack.pop()
 
 	if minify:
-		state_list = list(states.values())
-		for i, state in enumerate(state_list):
-			for other in state_list[i+1:]:
-				if state.can_merge(other):
-					debug("merging", state.id, other.id)
-					merge[state.id] = other.id
-		for k, v in merge.items():
-			merge[k] = merge[v]
+		cores = {}
+		for state in states.values():
+			core = cores.setdefault(frozenset(state.keys()), state.id)
+			if core != state.id:
+				debug("merging", state.id, core)
+				merge[state.id] = core
+	for k, v in merge.items():
+		merge[k] = merge[v]
 
 	merge_goto = {}
 	active_states = set()
@@ -355,56 +479,549 @@ def unroll(rules, start, minify=False):
 		else:
 			debug("dismiss", k)
 
-	grouped = group(small_goto)
-	l = len(grouped.keys())
-	for s in range(l):
-		for o in range(s+1, l):
-			if grouped[s] == grouped[o]:
-				print("uncaught merge", s, o)
-
+	if minify:
+		small_goto, small_states, _ = minimise(small_goto, small_states)
+	else:
+		rows = {}
+		for s, row in group(small_goto).items():
+			o = rows.setdefault(frozenset(row.items()), s)
+			if o != s:
+				print("uncaught merge", o, s)
+
+	if stats is not None:
+		stats.update(states=len(small_states), entries=len(small_goto))
+		if minify:
+			stats["minify"] = {"states": len({state for _, state in goto})-len(small_states), "entries": len(goto)-len(small_goto)}
 	return rules, small_goto, small_states
 
 
-def parse(goto, tokens, lexer, ctx):
-	grouped = group(goto)
-	states = [0]
+def minimise(goto, states=None):
+	"""Hopcroft partition refinement of a finished table: states with the same
+	reductions whose transitions lead to equivalent states are merged"""
+	rows = group(goto)
+	blocks = []
+	block_of = {}
+	signatures = {}
+	incoming = {}
+	inverse = MultiDict()
+	for state, row in rows.items():
+		signature = frozenset((token, None if isinstance(v, int) else v) for token, v in row.items())
+		if signature not in signatures:
+			signatures[signature] = len(blocks)
+			blocks.append(set())
+		block_of[state] = signatures[signature]
+		blocks[block_of[state]].add(state)
+		for token, v in row.items():
+			if isinstance(v, int):
+				inverse.put((token, v), state)
+				incoming.setdefault(v, set()).add(token)
+
+	work = set()
+	for b, block in enumerate(blocks):
+		for state in block:
+			work.update((b, token) for token in incoming.get(state, ()))
+	while work:
+		b, token = work.pop()
+		sources = set()
+		for target in blocks[b]:
+			sources.update(inverse.get((token, target), ()))
+		touched = {}
+		for state in sources:
+			touched.setdefault(block_of[state], set()).add(state)
+		for c, inside in touched.items():
+			if len(inside) == len(blocks[c]):
+				continue
+			outside = blocks[c]-inside
+			if len(inside) > len(outside):
+				inside, outside = outside, inside
+			blocks[c] = outside
+			new = len(blocks)
+			blocks.append(inside)
+			for state in inside:
+				block_of[state] = new
+				work.update((new, token) for token in incoming.get(state, ()))
+
+	leaders = sorted(min(block) for block in blocks)
+	small = {block_of[state]: i for i, state in enumerate(leaders)}
+	merge = {state: small[b] for state, b in block_of.items()}
+	leaders = set(leaders)
+	small_goto = {}
+	small_states = {}
+	for (token, state), v in goto.items():
+		if state in leaders:
+			small_goto[(token, merge[state])] = merge[v] if isinstance(v, int) else v
+			if states is not None and state in states:
+				small_states[merge[state]] = states[state]
+				states[state].id = merge[state]
+	report = {"states": len(rows)-len(blocks), "entries": len(goto)-len(small_goto)}
+	debug("minimise:", report)
+	return small_goto, small_states, report
+
+
+def digraph(nodes, relation, initial):
+	"""DeRemer and Pennello's digraph algorithm: for each node, the union of the
+	initial sets of every node reachable through relation"""
+	result = {node: Set(initial[node]) for node in nodes}
+	depth = dict.fromkeys(nodes, 0)
+	infinity = len(nodes)+1
 	stack = []
-	tree = []
+	for node in nodes:
+		if depth[node]:
+			continue
+		stack.append(node)
+		depth[node] = len(stack)
+		calls = [(node, iter(relation.get(node, ())), len(stack))]
+		while calls:
+			x, edges, d = calls[-1]
+			for y in edges:
+				if depth[y] == 0:
+					stack.append(y)
+					depth[y] = len(stack)
+					calls.append((y, iter(relation.get(y, ())), len(stack)))
+					break
+				depth[x] = min(depth[x], depth[y])
+				result[x].update(result[y])
+			else:
+				calls.pop()
+				if depth[x] == d:
+					while True:
+						top = stack.pop()
+						depth[top] = infinity
+						result[top] = result[x]
+						if top is x:
+							break
+				if calls:
+					parent = calls[-1][0]
+					depth[parent] = min(depth[parent], depth[x])
+					result[parent].update(result[x])
+	return result
+
+
+def lalr(rules, start, minify=False, stats=None):
+	"""LALR(1) construction: LR(0) automaton with lookaheads computed by
+	DeRemer and Pennello's Reads/Includes relations"""
+	accept = NT("__ACCEPT__")
+	rules.add_rule(accept, [start, EOF])
+	rules.analyse()
+	origin = State()
+	origin.add_rule(rules[accept])
+	origin.close(rules)
+
+	states = [origin]
+	transitions = []
+	index = {frozenset(origin.keys()): 0}
+	for state in states:
+		kernels = {}
+		for position in state.values():
+			if not position.on_end():
+				kernels.setdefault(position.at(), []).append(position)
+		shift = {}
+		for at, positions in kernels.items():
+			key = frozenset((position.rule_id, position.position+1) for position in positions)
+			if key not in index:
+				index[key] = len(states)
+				other = State(*((position.rule_id, position.product, position.entry, position.position+1) for position in positions))
+				other.close(rules)
+				states.append(other)
+			shift[at] = index[key]
+		transitions.append(shift)
+
+	edges = [(p, at) for p, shift in enumerate(transitions) for at in shift if isinstance(at, NT)]
+	direct = {}
+	reads = MultiDict()
+	for p, at in edges:
+		r = transitions[p][at]
+		direct[(p, at)] = [token for token in transitions[r] if not isinstance(token, NT)]
+		for token in transitions[r]:
+			if isinstance(token, NT) and rules[token].nullable:
+				reads.put((p, at), (r, token))
+	read = digraph(edges, reads, direct)
+
+	includes = MultiDict()
+	lookback = MultiDict()
+	for p, product in edges:
+		for i, entry in enumerate(rules[product].entries):
+			q = p
+			for j, token in enumerate(entry.tokens):
+				if isinstance(token, NT) and rules.first_of(entry.tokens[j+1:])[1]:
+					includes.put((q, token), (p, product))
+				q = transitions[q][token]
+			lookback.put((q, ((product, i), entry.length)), (p, product))
+	follow = digraph(edges, includes, read)
+
+	for (q, key), sources in lookback.items():
+		look = states[q][key].look
+		for source in sources:
+			look.update(follow[source])
+
+	final = transitions[transitions[0][start]][EOF]
+	small = {}
+	for i, state in enumerate(states):
+		if i != final:
+			small[i] = len(small)
+	goto = {}
+	small_states = {}
+	for i, state in enumerate(states):
+		if i not in small:
+			continue
+		state.id = small[i]
+		small_states[state.id] = state
+		shift = {at: small.get(j, ACCEPT) for at, j in transitions[i].items()}
+		reduce = state.reductions(shift, rules)
+		for at, v in shift.items():
+			goto[(at, state.id)] = v
+		for at, v in reduce.items():
+			goto[(at, state.id)] = v
+
+	if minify:
+		goto, small_states, report = minimise(goto, small_states)
+	if stats is not None:
+		stats.update(states=len(small_states), entries=len(goto))
+		if minify:
+			stats["minify"] = report
+	return rules, goto, small_states
+
+
+def unexpected(table, last_valid, token, lexer, offset=0):
+	"""Syntax error on token, listing the tokens expected in last_valid"""
+	expected = table.expected(last_valid)
+	return Illegal_Token(f"Syntax error: unexpected token {token}", lexer.file_name, lexer.text, token, note=f"expected {enum_list(expected)}", offset=offset)
+
+
+def parse(table, tokens, lexer, ctx):
+	terminals = table.terminals
+	base, check, value = table.base, table.check, table.value
+	goto_base, goto_value = table.goto_base, table.goto_value
+	accept, default, rules = table.accept, table.default, table.rules
+	verbose = debug.verbose
+	# top is the index of the current state in the preallocated stacks
+	size = STACK
+	states = [0]*size
+	values = [None]*size
+	top = 0
 	last_valid = 0
 	last_token = None
 	try:
-		while tokens:
-			token = tokens[0]
-			state = states[-1]
-			debug(states, tokens, stack)
-			if (token.type, state) not in goto:
-				expected = [_ for _ in grouped[last_valid] if not isinstance(_, NT)]
-				raise Illegal_Token(f"Syntax error: unexpected token {token}", lexer.file_name, lexer.text, token, note=f"expected {enum_list(expected)}")
-			result = goto[(token.type, state)]
-			debug(result, tree)
-			if result is ACCEPT:
-				return tree[0], None
-			elif isinstance(result, int):
+		tokens = iter(tokens)
+		token = next(tokens, None)
+		while token is not None:
+			state = states[top]
+			if verbose:
+				debug(states[:top+1], token, values[1:top+1])
+			result = default[state]
+			if not result:
+				t = terminals.get(token.type)
+				if t is None or check[base[state]+t] != state:
+					raise unexpected(table, last_valid, token, lexer)
+				result = value[base[state]+t]
+			if result > 0:
 				# shift
-				states.append(result)
-				last_valid = result
-				tokens.pop(0)
-				stack.append(token.type)
-				tree.append(token.value)
+				last_valid = result-1
+				top += 1
+				if top == size:
+					states += [0]*size
+					values += [None]*size
+					size += size
+				states[top] = last_valid
+				values[top] = token.value
+				last_token = token
+				token = next(tokens, None)
+			elif result == accept:
+				return values[1], None
 			else:
 				# reduce
-				product, length, method = result
-				args = tree[-length:]
-				tree = tree[:-length]
-				stack = stack[:-length]
-				states = states[:-length]
+				length, product, method = rules[-1-result]
+				if length:
+					args = values[top-length+1:top+1]
+					top -= length
+				else:
+					args = ()
 				try:
-					tree.append(method(ctx, *args))
+					result = method(ctx, *args)
 				except ParserError as error:
 					raise Illegal_Token(str(error), lexer.file_name, lexer.text, last_token)
-				stack.append(product)
-				states.append(goto[(product, states[-1])])
-			last_token = token
+				top += 1
+				if top == size:
+					states += [0]*size
+					values += [None]*size
+					size += size
+				states[top] = goto_value[goto_base[states[top-1]]+product]
+				values[top] = result
+				last_token = token
+	except Illegal_Token as error:
+		return None, error.format_error()
+	return None, None
+
+
+def profile(table, tokens, lexer, ctx, counters):
+	"""parse counting the shifts by state, the reductions by rule, the time
+	spent in each semantic action and the maximum stack depth in counters"""
+	terminals = table.terminals
+	base, check, value = table.base, table.check, table.value
+	goto_base, goto_value = table.goto_base, table.goto_value
+	accept, default, rules = table.accept, table.default, table.rules
+	shifts, reductions, spent = counters["shifts"], counters["reductions"], counters["time"]
+	counters["parses"] += 1
+	states = [0]
+	values = []
+	last_valid = 0
+	last_token = None
+	try:
+		tokens = iter(tokens)
+		token = next(tokens, None)
+		while token is not None:
+			state = states[-1]
+			result = default[state]
+			if not result:
+				t = terminals.get(token.type)
+				if t is None or check[base[state]+t] != state:
+					raise unexpected(table, last_valid, token, lexer)
+				result = value[base[state]+t]
+			if result > 0:
+				shifts[state] = shifts.get(state, 0)+1
+				last_valid = result-1
+				states.append(last_valid)
+				values.append(token.value)
+				if len(states) > counters["depth"]:
+					counters["depth"] = len(states)
+				last_token = token
+				token = next(tokens, None)
+			elif result == accept:
+				return values[0], None
+			else:
+				rule = -1-result
+				length, product, method = rules[rule]
+				if length:
+					args = values[-length:]
+					del values[-length:]
+					del states[-length:]
+				else:
+					args = ()
+				start = perf_counter()
+				try:
+					values.append(method(ctx, *args))
+				except ParserError as error:
+					raise Illegal_Token(str(error), lexer.file_name, lexer.text, last_token)
+				finally:
+					spent[rule] = spent.get(rule, 0)+perf_counter()-start
+					reductions[rule] = reductions.get(rule, 0)+1
+				states.append(goto_value[goto_base[states[-1]]+product])
+				last_token = token
+	except Illegal_Token as error:
+		return None, error.format_error()
+	return None, None
+
+
+def validate(table, tokens, lexer, counters=None):
+	"""Run the automaton without semantic actions nor values, returns the
+	first syntax error, formatted like parse, or None. With counters, adds
+	the reductions performed and the reductions skipped by bypassed unit
+	productions to its "reductions" and "saved" entries"""
+	terminals = table.terminals
+	base, check, value = table.base, table.check, table.value
+	goto_base, goto_value = table.goto_base, table.goto_value
+	accept, default, rules, bypass = table.accept, table.default, table.rules, table.bypass
+	size = STACK
+	states = [0]*size
+	top = 0
+	last_valid = 0
+	try:
+		for token in tokens:
+			t = terminals.get(token.type)
+			while True:
+				state = states[top]
+				result = default[state]
+				if not result:
+					if t is None or check[base[state]+t] != state:
+						raise unexpected(table, last_valid, token, lexer)
+					result = value[base[state]+t]
+				if result > 0:
+					last_valid = result-1
+					top += 1
+					if top == size:
+						states += [0]*size
+						size += size
+					states[top] = last_valid
+					break
+				if result == accept:
+					return None
+				length, product, _ = rules[-1-result]
+				top -= length
+				if counters is not None:
+					counters["reductions"] += 1
+					counters["saved"] += bypass.get((states[top], product), 0)
+				top += 1
+				if top == size:
+					states += [0]*size
+					size += size
+				states[top] = goto_value[goto_base[states[top-1]]+product]
+	except Illegal_Token as error:
+		return error.format_error()
+	return None
+
+
+def walk(table, tokens, lexer, handler):
+	"""Run the automaton and report its steps to handler instead of building
+	values: on_shift(token), on_reduce(rule, span) with span the range of
+	token indexes covered by the rule, and on_accept(). Returns the first
+	error like parse, or None"""
+	terminals = table.terminals
+	base, check, value = table.base, table.check, table.value
+	goto_base, goto_value = table.goto_base, table.goto_value
+	accept, default, lengths, products = table.accept, table.default, table.lengths, table.products
+	on_shift, on_reduce = handler.on_shift, handler.on_reduce
+	states = [0]
+	starts = []
+	shifted = 0
+	last_valid = 0
+	try:
+		for token in tokens:
+			t = terminals.get(token.type)
+			while True:
+				state = states[-1]
+				result = default[state]
+				if not result:
+					if t is None or check[base[state]+t] != state:
+						raise unexpected(table, last_valid, token, lexer)
+					result = value[base[state]+t]
+				if result > 0:
+					last_valid = result-1
+					states.append(last_valid)
+					starts.append(shifted)
+					shifted += 1
+					try:
+						on_shift(token)
+					except ParserError as error:
+						raise Illegal_Token(str(error), lexer.file_name, lexer.text, token)
+					break
+				if result == accept:
+					handler.on_accept()
+					return None
+				rule = -1-result
+				length = lengths[rule]
+				if length:
+					start = starts[-length]
+					del starts[-length:]
+					del states[-length:]
+				else:
+					start = shifted
+				starts.append(start)
+				try:
+					on_reduce(rule, (start, shifted))
+				except ParserError as error:
+					raise Illegal_Token(str(error), lexer.file_name, lexer.text, token)
+				states.append(goto_value[goto_base[states[-1]]+products[rule]])
+	except Illegal_Token as error:
+		return error.format_error()
+	return None
+
+
+class Log:
+	"""Compact record of a parse. Each event is the index of a shifted token
+	or -1-rule for a reduction, a node is the position of its event. Semantic
+	actions only run when the value of a node is asked"""
+	def __init__(self, table, events, tokens, ctx):
+		self.table = table
+		self.events = events
+		self.tokens = tokens
+		self.ctx = ctx
+		self.starts = None
+
+	def __len__(self):
+		return len(self.events)
+
+	def root(self):
+		return len(self.events)-1
+
+	def rule(self, node):
+		"""Reduced rule of node, None for a token"""
+		event = self.events[node]
+		return None if event >= 0 else -1-event
+
+	def start(self, node):
+		"""Position of the first event of the subtree of node"""
+		if self.starts is None:
+			starts = array(self.events.typecode, self.events)
+			stack = []
+			for node, event in enumerate(self.events):
+				if event < 0:
+					length = self.table.lengths[-1-event]
+					if length:
+						starts[node] = stack[-length]
+						del stack[-length:]
+					else:
+						starts[node] = node
+				else:
+					starts[node] = node
+				stack.append(starts[node])
+			self.starts = starts
+		return self.starts[node]
+
+	def children(self, node):
+		event = self.events[node]
+		if event >= 0:
+			return []
+		children = []
+		child = node-1
+		for _ in range(self.table.lengths[-1-event]):
+			children.append(child)
+			child = self.start(child)-1
+		return children[::-1]
+
+	def value(self, node=None):
+		"""Run the semantic actions of the subtree of node, the root by default"""
+		if node is None:
+			node = self.root()
+		tokens, rules, ctx = self.tokens, self.table.rules, self.ctx
+		values = []
+		for event in self.events[self.start(node):node+1]:
+			if event >= 0:
+				values.append(tokens[event])
+				continue
+			length, _, method = rules[-1-event]
+			if length:
+				args = values[-length:]
+				del values[-length:]
+			else:
+				args = ()
+			values.append(method(ctx, *args))
+		return values[0]
+
+
+def record(table, tokens, lexer, ctx):
+	"""Parse without running semantic actions, returns a Log of the parse
+	and the error like parse"""
+	terminals = table.terminals
+	base, check, value = table.base, table.check, table.value
+	goto_base, goto_value = table.goto_base, table.goto_value
+	accept, default, lengths, products = table.accept, table.default, table.lengths, table.products
+	events = array("i")
+	shifted = []
+	states = [0]
+	last_valid = 0
+	try:
+		for token in tokens:
+			t = terminals.get(token.type)
+			while True:
+				state = states[-1]
+				result = default[state]
+				if not result:
+					if t is None or check[base[state]+t] != state:
+						raise unexpected(table, last_valid, token, lexer)
+					result = value[base[state]+t]
+				if result > 0:
+					last_valid = result-1
+					states.append(last_valid)
+					events.append(len(shifted))
+					shifted.append(token.value)
+					break
+				if result == accept:
+					return Log(table, events, shifted, ctx), None
+				events.append(result)
+				rule = -1-result
+				if lengths[rule]:
+					del states[-lengths[rule]:]
+				states.append(goto_value[goto_base[states[-1]]+products[rule]])
 	except Illegal_Token as error:
 		return None, error.format_error()
 	return None, None
@@ -1,17 +1,34 @@
-from .lrk import Rules, NT, unroll, parse, group
+from .lrk import Rules, NT, unroll, lalr, parse, profile, validate, walk, record, unexpected, group
+from .errors import Illegal_Token, ParserError
+from .table import Table
+from . import cache, codegen
 
 
-def production(*tokens, out=None):
+IDENTITY = {1: (lambda x: x).__code__.co_code, 2: (lambda ctx, x: x).__code__.co_code}
+
+
+def passthrough(method):
+	"""Whether method only returns its last argument"""
+	code = method.__code__
+	return IDENTITY.get(code.co_argcount) == code.co_code
+
+
+def production(*tokens, out=None, prec=None):
 	if out is None:
 		raise ValueError("Production rule can't produce None")
 	class deco:
 		def __init__(self, method):
 			argcount = method.__code__.co_argcount
+			identity = len(tokens) == 1 and passthrough(method)
 			if argcount == len(tokens):
 				old = method
 				method = lambda parser, *args: old(*args)
 			elif argcount != len(tokens)+1:
 				raise ValueError("Production rule must have the same number of arguments as left tokens")
+			if identity:
+				method.identity = True
+			if prec is not None:
+				method.prec = prec
 			entry = (out, tokens, method)
 			production.entries.append(entry)
 
@@ -20,7 +37,6 @@ def production(*tokens, out=None):
 				owner.ENTRIES = production.entries
 			else:
 				owner.ENTRIES.extend(production.entries)
-			owner.build()
 			production.entries = []
 
 	return deco
@@ -28,21 +44,162 @@ def production(*tokens, out=None):
 production.entries = []
 
 
+def init_worker(parser, Lexer):
+	"""Process pool initializer, tables are built or loaded once per worker"""
+	init_worker.classes = parser.freeze(), Lexer
+
+
+def parse_text(text, file_name="<stdin>"):
+	parser, Lexer = init_worker.classes
+	lexer = Lexer(text, file_name)
+	return parser().parse(lexer.iter_tokens(), lexer)
+
+
+def parse_file(path):
+	with open(path, "r") as file:
+		return parse_text(file.read(), path)
+
+
 class Parser:
 	START = "S"
 	MINIFY = False
+	SHORTCUT = False
+	ALGORITHM = "lr"
+	PRECEDENCE = ()
+	PROFILE = False
+	BACKEND = "table"
 	ENTRIES = None
+	TABLE = None
+	CODE = None
+	HANDLERS = None
+	CACHE = cache.DIRECTORY
+	TABLES = None
 	@classmethod
 	def build(cls):
 		if cls.ENTRIES is None:
 			cls.ENTRIES = []
 		rules = Rules(*cls.ENTRIES)
-		rules, goto, states = unroll(rules, cls.START, cls.MINIFY)
-		cls.ENTRIES = goto
+		rules.add_precedence(*cls.PRECEDENCE)
+		cls.ACTIONS = rules.actions()
+		cls.RULES = rules.entries()
+		key = cls.fingerprint()
+		data = cache.find(cls.TABLES, "parser", cls.__name__, key) or cache.load(cls.CACHE, "parser", key)
+		if data is not None:
+			cls.load(data)
+			return
+		construct = lalr if cls.ALGORITHM == "lalr" else unroll
+		cls.STATS = {}
+		rules, goto, states = construct(rules, cls.START, cls.MINIFY, cls.STATS)
+		cls.TABLE = Table(goto, cls.ACTIONS, cls.SHORTCUT)
+		cls.STATS["bytes"] = cls.TABLE.nbytes()
+		if cls.SHORTCUT:
+			cls.STATS["shortcut"] = {"default": sum(map(bool, cls.TABLE.default)), "bypass": len(cls.TABLE.bypass)}
+		cls.CODE = codegen.generate(cls.TABLE) if cls.BACKEND == "code" else None
+		cls.compile()
+		cache.store(cls.CACHE, "parser", key, cls.dump())
+
+	@classmethod
+	def fingerprint(cls):
+		symbol = lambda token: (token.name,) if isinstance(token, NT) else token
+		return cache.fingerprint(
+			symbol(cls.START), cls.MINIFY, cls.SHORTCUT, cls.ALGORITHM, cls.BACKEND, tuple(map(tuple, cls.PRECEDENCE)),
+			[(symbol(out), [symbol(token) for token in tokens], getattr(method, "prec", None), getattr(method, "identity", False)) for out, tokens, method in cls.ENTRIES])
+
+	@classmethod
+	def dump(cls):
+		"""Serializable form of the table, reductions are stored by rule index"""
+		return {"table": cls.freeze().TABLE.dump(), "stats": cls.STATS, "code": cls.CODE}
+
+	@classmethod
+	def load(cls, data):
+		symbols = {token.name: token for product, tokens, _ in cls.ENTRIES for token in (product, *tokens) if isinstance(token, NT)}
+		cls.TABLE = Table.load(data["table"], cls.ACTIONS, symbols)
+		cls.STATS = data["stats"]
+		cls.CODE = data["code"]
+		cls.compile()
+
+	@classmethod
+	def compile(cls):
+		"""Compile the generated source of the "code" backend"""
+		cls.HANDLERS = None
+		if cls.CODE is not None:
+			source, symbols = cls.CODE
+			cls.HANDLERS = codegen.load(source, symbols, cls.TABLE, f"<{cls.__name__}>")
+
+	@classmethod
+	def freeze(cls):
+		"""Build the table if it was not built yet, productions declared
+		afterwards are ignored"""
+		if "TABLE" not in vars(cls):
+			cls.build()
+		return cls
+
+	@classmethod
+	def report(cls, tokens, lexer):
+		"""Reductions per token on a sample token list, and how many of them
+		are saved by SHORTCUT, None on a syntax error"""
+		tokens = list(tokens)
+		counters = {"reductions": 0, "saved": 0}
+		if validate(cls.freeze().TABLE, tokens, lexer, counters) is not None:
+			return None
+		return {"tokens": len(tokens), "reductions": counters["reductions"]/len(tokens), "saved": counters["saved"]/len(tokens)}
+
+	@classmethod
+	def validate(cls, tokens, lexer):
+		"""Recognition only, returns the first error or None"""
+		return validate(cls.freeze().TABLE, tokens, lexer)
+
+	@classmethod
+	def walk(cls, tokens, lexer, handler):
+		"""Report the shifts and reductions of the parse to a Handler instead
+		of running the semantic actions, returns the first error or None"""
+		return walk(cls.freeze().TABLE, tokens, lexer, handler)
+
+	@classmethod
+	def parse_many(cls, texts, Lexer, workers=None, chunksize=1):
+		"""Lex and parse texts in a pool of worker processes, each with a new
+		parser. Yields (result, error) in order as they complete"""
+		from concurrent.futures import ProcessPoolExecutor
+		with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(cls, Lexer)) as pool:
+			yield from pool.map(parse_text, texts, chunksize=chunksize)
+
+	@classmethod
+	def parse_files(cls, paths, Lexer, workers=None, chunksize=1):
+		"""Same as parse_many, the files are read by the workers"""
+		from concurrent.futures import ProcessPoolExecutor
+		with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(cls, Lexer)) as pool:
+			yield from pool.map(parse_file, paths, chunksize=chunksize)
+
+	@classmethod
+	def counters(cls):
+		"""Profiling counters of the parses run with PROFILE: shifts by state,
+		reductions and time spent in the semantic action by rule index, and
+		the maximum stack depth"""
+		if "COUNTERS" not in vars(cls):
+			cls.COUNTERS = {"parses": 0, "shifts": {}, "reductions": {}, "time": {}, "depth": 0}
+		return cls.COUNTERS
+
+	@classmethod
+	def profile_report(cls, sort="time", limit=None):
+		"""Text report of the counters, rules sorted by "time" or "reductions" """
+		counters = cls.counters()
+		reductions, spent = counters["reductions"], counters["time"]
+		total = sum(spent.values())
+		lines = [f"{counters['parses']} parses, {sum(reductions.values())} reductions in {total:.6f} seconds, max depth {counters['depth']}", ""]
+		lines.append(f"{'reductions':>12} {'tottime':>10} {'percall':>10}  rule")
+		for rule in sorted(reductions, key=lambda rule: -counters[sort][rule])[:limit]:
+			n = reductions[rule]
+			lines.append(f"{n:>12} {spent[rule]:>10.6f} {spent[rule]/n:>10.6f}  {cls.RULES[rule]!r}")
+		lines.append("")
+		lines.append(f"{'shifts':>12}  state")
+		shifts = counters["shifts"]
+		for state in sorted(shifts, key=lambda state: -shifts[state])[:limit]:
+			lines.append(f"{shifts[state]:>12}  {state}")
+		return "\n".join(lines)
 
 	@classmethod
 	def print(cls, level=0):
-		grouped = group(cls.ENTRIES)
+		grouped = group(cls.freeze().TABLE.to_dict())
 		for s in sorted(grouped.keys()):
 			if level == 0:
 				print(s, ":", tuple(grouped[s].keys()))
@@ -59,4 +216,121 @@ class Parser:
 		return []
 
 	def parse(self, tokens, lexer):
-		return parse(self.ENTRIES, tokens, lexer, self.get_context())
+		table = self.freeze().TABLE
+		if self.PROFILE:
+			return profile(table, tokens, lexer, self.get_context(), self.counters())
+		if self.HANDLERS is not None:
+			return codegen.parse(self.HANDLERS, table, tokens, lexer, self.get_context())
+		return parse(table, tokens, lexer, self.get_context())
+
+	def record(self, tokens, lexer):
+		"""Parse without semantic actions, returns a Log running them on demand"""
+		return record(self.freeze().TABLE, tokens, lexer, self.get_context())
+
+	def push(self, lexer):
+		return PushParser(self, lexer)
+
+	async def parse_stream(self, reader, lexer, every=1000):
+		"""Parse the text read from an asyncio.StreamReader, giving control
+		back to the event loop every few tokens"""
+		parser = self.push(lexer)
+		try:
+			async for token in lexer.aiter_tokens(reader, every):
+				if parser.feed(token):
+					break
+		except Illegal_Token as error:
+			return None, error.format_error()
+		return parser.finish()
+
+
+class Handler:
+	"""Receiver of the events of Parser.walk, rule is an index of the
+	parser ACTIONS and span the range of token indexes it covers"""
+	def on_shift(self, token):
+		pass
+
+	def on_reduce(self, rule, span):
+		pass
+
+	def on_accept(self):
+		pass
+
+
+class PushParser:
+	"""Incremental parser, tokens or chunks of text are pushed as they are
+	received and the state and value stacks are kept between calls. lexer
+	lexes the pushed text and locates the errors"""
+	def __init__(self, parser, lexer):
+		self.table = parser.freeze().TABLE
+		self.ctx = parser.get_context()
+		self.lexer = lexer
+		self.states = [0]
+		self.values = []
+		self.last_valid = 0
+		self.last_token = None
+		self.done = False
+		self.result = None
+		self.error = None
+
+	def feed(self, token):
+		"""Push one token, returns the error once the input can't be parsed"""
+		if self.error is None and not self.done:
+			try:
+				self.step(token)
+			except Illegal_Token as error:
+				self.error = error.format_error()
+		return self.error
+
+	def feed_text(self, chunk, final=False):
+		"""Push the tokens completed by chunk, a token cut at the end of chunk
+		is pushed with the next one. Returns the error like feed"""
+		if self.error is None and not self.done:
+			try:
+				for token in self.lexer.feed(chunk, final):
+					if self.feed(token):
+						break
+			except Illegal_Token as error:
+				self.error = error.format_error()
+		return self.error
+
+	def finish(self):
+		"""End the input, returns the result and the error like Parser.parse"""
+		self.feed_text("", True)
+		if self.error is not None:
+			return None, self.error
+		return self.result, None
+
+	def step(self, token):
+		table, lexer = self.table, self.lexer
+		states, values = self.states, self.values
+		while True:
+			state = states[-1]
+			result = table.default[state]
+			if not result:
+				t = table.terminals.get(token.type)
+				if t is None or table.check[table.base[state]+t] != state:
+					raise unexpected(table, self.last_valid, token, lexer, lexer.offset)
+				result = table.value[table.base[state]+t]
+			if result > 0:
+				self.last_valid = result-1
+				states.append(self.last_valid)
+				values.append(token.value)
+				self.last_token = token
+				return
+			if result == table.accept:
+				self.result = values[0]
+				self.done = True
+				return
+			length, product, method = table.rules[-1-result]
+			if length:
+				args = values[-length:]
+				del values[-length:]
+				del states[-length:]
+			else:
+				args = ()
+			try:
+				values.append(method(self.ctx, *args))
+			except ParserError as error:
+				raise Illegal_Token(str(error), lexer.file_name, lexer.text, self.last_token, offset=lexer.offset)
+			states.append(table.goto_value[table.goto_base[states[-1]]+product])
+			self.last_token = token
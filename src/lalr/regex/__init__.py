@@ -1,2 +1,2 @@
 from .regex import RegexGraph, to_ascii
-from .parser import parse_regex
+from .parser import parse_regex, supported
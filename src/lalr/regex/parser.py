@@ -197,3 +197,45 @@ def parse_regex(text):
 	if i < len(text):
 		raise ParsingError.unexpected(text, text[i], i)
 	return expr
+
+
+def supported(text):
+	"""Whether parse_regex reads text like the re module does: escaped
+	letters and digits, extension groups, ^ and alternatives out of a group
+	are not supported"""
+	depth = 0
+	i = 0
+	while i < len(text):
+		char = text[i]
+		i += 1
+		if char == "\\":
+			if i >= len(text) or text[i].isalnum():
+				return False
+			i += 1
+		elif char == "[":
+			if text[i:i+1] == "^":
+				i += 1
+			if text[i:i+1] == "]":
+				return False
+			while i < len(text) and text[i] != "]":
+				if text[i] == "[":
+					return False
+				if text[i] == "\\":
+					if i+1 >= len(text) or text[i+1].isalnum():
+						return False
+					i += 1
+				i += 1
+			i += 1
+		elif char == "(":
+			if text[i:i+1] == "?":
+				return False
+			depth += 1
+		elif char == ")":
+			depth -= 1
+		elif char == "^" or (char == "|" and depth == 0):
+			return False
+	try:
+		parse_regex(text)
+	except ParsingError:
+		return False
+	return True
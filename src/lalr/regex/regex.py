@@ -1,3 +1,6 @@
+from array import array
+
+
 NOT_MATCH = False
 HAS_MATCH = True
 EPSILON = None
@@ -340,6 +343,14 @@ class RegexMatch:
 		return f" {to_string(self.entry)}\n{' '*(self.length>0)}{'~'*(self.length-1)}^\n"+"\n".join(map(str, self.families))
 
 
+class CharClasses(dict):
+	"""Character code to class translation, characters out of the alphabet
+	fall in the class of the last character of the alphabet, so that they
+	are matched by the wildcard and the inverted sets"""
+	def __missing__(self, char):
+		return self[CharSet.max_char]
+
+
 class RegexState:
 	def __init__(self, exprs=None, transitions=None, accept=None):
 		self.transitions = transitions or {}
@@ -356,23 +367,93 @@ class RegexGraph(list):
 	def __init__(self, *exprs):
 		super().__init__([RegexState([Family(expr, i) for i, expr in enumerate(exprs)])])
 
-	def match(self, entry, state_id=0):
+	def match(self, entry, state_id=0, pos=0):
 		state = self[state_id]
 		current = None
-		i = -1
-		for i, char in enumerate(entry):
+		for i in range(pos, len(entry)):
 			if state.accept:
-				current = RegexMatch(entry, i, state.accept)
+				current = RegexMatch(entry, i-pos, state.accept)
+			char = entry[i]
 			for path, state_id in state.transitions.items():
 				if path.contains(char):
 					state = self[state_id]
 					break
 			else:
 				return current
+		if state.accept:
+			return RegexMatch(entry, len(entry)-pos, state.accept)
+		return current
+
+	def tabulate(self):
+		"""Flatten the transitions: classes maps a character code to its class,
+		table[state*width+class] is the next state or -1, and accepts[state]
+		is the first family accepted in state or -1. exits[state] tells if
+		state has any transition"""
+		rows = []
+		for transitions, _, _ in self:
+			row = [-1]*(CharSet.max_char+1)
+			for path, state in transitions.items():
+				for min_char, max_char in path.ranges:
+					row[min_char:max_char+1] = [state]*(max_char-min_char+1)
+			rows.append(row)
+		signatures = {(-1,)*len(self): 0}
+		classes = CharClasses()
+		for char in range(CharSet.max_char+1):
+			classes[char] = signatures.setdefault(tuple(row[char] for row in rows), len(signatures))
+		self.width = len(signatures)
+		self.table = array("i", [-1])*(len(self)*self.width)
+		for signature, char_class in signatures.items():
+			for state, target in enumerate(signature):
+				self.table[state*self.width+char_class] = target
+		self.classes = classes
+		self.byte_classes = bytes(classes[char] for char in range(256))
+		self.accepts = array("i", [accept[0].id if accept else -1 for _, accept, _ in self])
+		self.exits = bytes(any(target >= 0 for target in row) for row in rows)
+		return self
+
+	def classify(self, text):
+		"""Bytes of the classes of the characters of text"""
+		return text.translate(self.classes).encode("latin-1")
+
+	def scan(self, data, pos=0, classes=None, run=None):
+		"""Longest match in data from pos as (length, family, run), family is
+		-1 without a match. run is None unless the automaton was still running
+		at the end of data, more data could then change the match: passing it
+		back resumes the scan from the end of the data it reached. data is
+		classified, or made of bytes classified on the fly by classes"""
+		table, accepts, width = self.table, self.accepts, self.width
+		if run is None:
+			state, i, end, family = 0, pos, -1, -1
 		else:
-			if state.accept:
-				return RegexMatch(entry, i+1, state.accept)
-			return current
+			state, i, end, family = run
+			i += pos
+			end += pos
+		size = len(data)
+		if classes is None:
+			while True:
+				if accepts[state] >= 0:
+					end = i
+					family = accepts[state]
+				if i == size:
+					break
+				state = table[state*width+data[i]]
+				if state < 0:
+					break
+				i += 1
+		else:
+			while True:
+				if accepts[state] >= 0:
+					end = i
+					family = accepts[state]
+				if i == size:
+					break
+				state = table[state*width+classes[data[i]]]
+				if state < 0:
+					break
+				i += 1
+		if state < 0 or not self.exits[state]:
+			return end-pos, family, None
+		return end-pos, family, (state, i-pos, end-pos, family)
 
 	def run(self, entry, state_id=0):
 		state = self[state_id]
@@ -417,16 +498,9 @@ class RegexGraph(list):
 		stop = len(self)
 		for i in range(state_id, stop):
 			transitions, accept, exprs = self[i]
-			can_end = False
-			for expr in exprs:
-				for path, _, _ in expr.advance(False):
-					if path is EPSILON:
-						can_end = True
-						break
-				if can_end:
-					break
+			ends = {expr.id for expr in exprs if any(path is EPSILON for path, _, _ in expr.advance(False))}
 			for j, expr in enumerate(exprs):
-				sub_exprs = expr.advance(can_end)
+				sub_exprs = expr.advance(expr.id in ends)
 				for path, status, sub_expr in sub_exprs:
 					if path is EPSILON:
 						add_unique(accept, expr)
@@ -463,7 +537,7 @@ class RegexGraph(list):
 			state = self._compile(last)
 		if aggregate:
 			self.aggregate()
-		return self
+		return self.tabulate()
 
 	def merge_state(self, i, j, replace=False):
 		if replace:
@@ -500,6 +574,18 @@ class RegexGraph(list):
 		for _, accept, _ in self:
 			accept.sort(key=lambda family: family.id)
 
+	def dump(self):
+		return [([(path.ranges, state) for path, state in transitions.items()], [family.id for family in accept])
+			for transitions, accept, _ in self]
+
+	@classmethod
+	def load(cls, data):
+		graph = cls()
+		graph[:] = [RegexState(
+			transitions={CharSet(*ranges): state for ranges, state in transitions},
+			accept=[Family(None, id) for id in accept]) for transitions, accept in data]
+		return graph.tabulate()
+
 	def analyse(self):
 		for i, (_, accept, _) in enumerate(self):
 			if len(accept) > 1:
@@ -0,0 +1,179 @@
+from array import array
+from .lrk import NT, EOF, ACCEPT, group
+
+
+def typecode(*arrays):
+	"""Smallest signed typecode holding every value of arrays"""
+	low = min((min(a, default=0) for a in arrays), default=0)
+	high = max((max(a, default=0) for a in arrays), default=0)
+	for code in "bhi":
+		bound = 1 << (8*array(code).itemsize-1)
+		if -bound <= low and high < bound:
+			return code
+	return "l"
+
+
+def shrink(*arrays):
+	code = typecode(*arrays)
+	return tuple(array(code, a) for a in arrays)
+
+
+def comb(rows, size):
+	"""Row displacement compression: the entry of column c in row s is stored
+	at base[s]+c, check records which row owns each slot"""
+	base = array("i", [0]*len(rows))
+	check = array("i")
+	value = array("i")
+	free = 0
+	for s in sorted(range(len(rows)), key=lambda s: -len(rows[s])):
+		row = rows[s]
+		if not row:
+			continue
+		while free < len(check) and check[free] != -1:
+			free += 1
+		b = max(0, free-min(c for c, _ in row))
+		while any(b+c < len(check) and check[b+c] != -1 for c, _ in row):
+			b += 1
+		end = b+max(c for c, _ in row)+1
+		if end > len(check):
+			check.extend([-1]*(end-len(check)))
+			value.extend([0]*(end-len(value)))
+		for c, v in row:
+			check[b+c] = s
+			value[b+c] = v
+		base[s] = b
+	end = max(base, default=0)+size
+	check.extend([-1]*(end-len(check)))
+	value.extend([0]*(end-len(value)))
+	return shrink(base, check, value)
+
+
+def shortcut(goto):
+	"""Default reductions and unit rule bypass, goto is modified in place
+
+	A state whose only action is a single reduction reduces without looking
+	at the next token. A non terminal transition leading to such a state for
+	an identity unit production goes directly to the target of the product.
+	Returns the default reductions by state and the number of reductions
+	skipped by each bypassed transition."""
+	defaults = {}
+	for state, row in group(goto).items():
+		actions = {v for token, v in row.items() if not isinstance(token, NT)}
+		if len(actions) == 1:
+			action, = actions
+			if isinstance(action, tuple):
+				defaults[state] = action
+	units = {state: action for state, action in defaults.items() if action[1] == 1 and getattr(action[2], "identity", False)}
+	bypass = {}
+	for (token, state), target in goto.items():
+		if not isinstance(token, NT):
+			continue
+		skipped = 0
+		while target in units and skipped < len(units):
+			target = goto[(units[target][0], state)]
+			skipped += 1
+		if skipped:
+			goto[(token, state)] = target
+			bypass[(token, state)] = skipped
+	return defaults, bypass
+
+
+class Table:
+	"""Integer coded action/goto tables
+
+	Terminals and non terminals are interned to small integers. A terminal
+	action is positive for a shift to state v-1, negative for a reduction of
+	rule -v-1, and equal to accept for the end of input. Both tables are
+	packed with comb compression in the smallest integer arrays that fit.
+	A non zero default is the reduction of a state that needs no lookahead."""
+	def __init__(self, goto=None, actions=(), optimise=False):
+		self.actions = list(actions)
+		self.terminals = {}
+		self.nonterminals = {}
+		self.bypass = {}
+		if goto is None:
+			return
+		defaults, bypass = {}, {}
+		if optimise:
+			goto = dict(goto)
+			defaults, bypass = shortcut(goto)
+		rules = {action: i for i, action in enumerate(self.actions)}
+		size = 1+max((state for _, state in goto), default=0)
+		self.accept = -1-len(self.actions)
+		shifts = [[] for _ in range(size)]
+		gotos = [[] for _ in range(size)]
+		for (token, state), v in goto.items():
+			if isinstance(token, NT):
+				gotos[state].append((self.nonterminals.setdefault(token, len(self.nonterminals)), v))
+			else:
+				t = self.terminals.setdefault(token, len(self.terminals))
+				shifts[state].append((t, v+1 if isinstance(v, int) else self.accept if v is ACCEPT else -1-rules[v]))
+		for product, _, _ in self.actions:
+			self.nonterminals.setdefault(product, len(self.nonterminals))
+		self.base, self.check, self.value = comb(shifts, len(self.terminals))
+		self.goto_base, self.goto_check, self.goto_value = comb(gotos, len(self.nonterminals))
+		self.default, = shrink([-1-rules[defaults[state]] if state in defaults else 0 for state in range(size)])
+		self.bypass = {(state, self.nonterminals[token]): skipped for (token, state), skipped in bypass.items()}
+		self.bind()
+
+	def bind(self):
+		self.products, = shrink([self.nonterminals[product] for product, _, _ in self.actions])
+		self.lengths, = shrink([length for _, length, _ in self.actions])
+		self.methods = [method for _, _, method in self.actions]
+		self.rules = list(zip(self.lengths, self.products, self.methods))
+
+	def __len__(self):
+		return len(self.base)
+
+	def action(self, state, token):
+		t = self.terminals.get(token)
+		if t is None or self.check[self.base[state]+t] != state:
+			return None
+		return self.value[self.base[state]+t]
+
+	def expected(self, state):
+		return [token for token in self.terminals if self.action(state, token) is not None]
+
+	def to_dict(self):
+		"""Table in the (token, state) -> action form produced by unroll"""
+		goto = {}
+		for state in range(len(self)):
+			for token, t in self.terminals.items():
+				v = self.action(state, token)
+				if v is None:
+					continue
+				goto[(token, state)] = v-1 if v > 0 else ACCEPT if v == self.accept else self.actions[-1-v]
+			for product, n in self.nonterminals.items():
+				i = self.goto_base[state]+n
+				if self.goto_check[i] == state:
+					goto[(product, state)] = self.goto_value[i]
+		return goto
+
+	def nbytes(self):
+		arrays = (self.base, self.check, self.value, self.goto_base, self.goto_check, self.goto_value, self.default)
+		return sum(len(a)*a.itemsize for a in arrays)
+
+	def dump(self):
+		"""Serializable form of the table, made of literals only"""
+		return {
+			"terminals": [None if token is EOF else token for token in self.terminals],
+			"nonterminals": [product.name if isinstance(product, NT) else product for product in self.nonterminals],
+			"accept": self.accept,
+			"bypass": [(state, n, skipped) for (state, n), skipped in self.bypass.items()],
+			**{name: getattr(self, name).tolist() for name in ("base", "check", "value", "goto_base", "goto_check", "goto_value", "default")},
+		}
+
+	@classmethod
+	def load(cls, data, actions, symbols):
+		"""Rebuild a dumped table, actions are bound again by rule index and
+		symbols maps non terminal names to their NT"""
+		table = cls(actions=actions)
+		table.terminals = {EOF if token is None else token: i for i, token in enumerate(data["terminals"])}
+		table.nonterminals = {symbols.get(name, name): i for i, name in enumerate(data["nonterminals"])}
+		table.accept = data["accept"]
+		table.base, table.check, table.value = shrink(data["base"], data["check"], data["value"])
+		table.goto_base, table.goto_check, table.goto_value = shrink(data["goto_base"], data["goto_check"], data["goto_value"])
+		table.default, = shrink(data["default"])
+		table.bypass = {(state, n): skipped for state, n, skipped in data["bypass"]}
+		table.bind()
+		return table
@@ -1,5 +1,6 @@
 from lalr.lrk import NT, Rules, unroll
 from lalr.parser import Parser
+from lalr.table import Table
 
 
 E = NT("E")
@@ -10,7 +11,7 @@ rules = Rules(
 	(B, ["d"]),
 )
 rules, goto, states = unroll(rules, E, False)
-Parser.ENTRIES = goto
+Parser.TABLE = Table(goto, rules.actions())
 Parser.print(1)
 print("""0 : {E: 1, B: 2, 'c': 3, 'd': 4}
 1 : {$: @}                      
@@ -25,7 +26,7 @@ print("""0 : {E: 1, B: 2, 'c': 3, 'd': 4}
 print("------------------------------------")
 input()
 rules, goto, states = unroll(rules, E, True)
-Parser.ENTRIES = goto
+Parser.TABLE = Table(goto, rules.actions())
 Parser.print(1)
 print("""0 : {E: 1, B: 2, 'c': 4, 'd': 5}
 1 : {$: @}                      
@@ -0,0 +1,90 @@
+import os
+import pickle
+import sys
+from importlib.util import spec_from_file_location, module_from_spec
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "grammars", "math"))
+from lalr import cache
+from lalr.__main__ import compile
+from main import LexerMath, ParserMath
+
+
+GRAMMAR = '''from lalr.lexer import Lexer, token
+from lalr.parser import Parser, production, NT
+
+
+class LexerSum(Lexer):
+	BACKEND = "graph"
+	ENTRIES = ["+"]
+	@token("[0-9]+")
+	def _(self, val):
+		return int(val), "n"
+
+
+E = NT("E")
+class ParserSum(Parser):
+	START = E
+	@production(E, "+", "n", out=E)
+	def _(a, _1, b):
+		return a+b
+	@production("n", out=E)
+	def _(a):
+		return a
+'''
+
+
+def variant(directory):
+	return type("ParserMath", (ParserMath,), {"CACHE": directory}).freeze()
+
+
+def mark(directory, key):
+	"""Replace the stats of a cached table to tell it from a new build"""
+	path = cache.path(directory, "parser", key)
+	with open(path, "rb") as file:
+		data = pickle.load(file)
+	data["stats"] = {"cached": True}
+	with open(path, "wb") as file:
+		pickle.dump(data, file)
+
+
+def parse(parser, text):
+	lexer = LexerMath(text)
+	tokens, _ = lexer.tokens()
+	return parser().parse(tokens, lexer)
+
+
+def test_cache(tmp_path, monkeypatch):
+	directory = str(tmp_path)
+	built = variant(directory)
+	key = built.fingerprint()
+	assert os.path.exists(cache.path(directory, "parser", key))
+	mark(directory, key)
+	loaded = variant(directory)
+	assert loaded.STATS == {"cached": True}
+	assert parse(loaded, "1+2*-3") == parse(built, "1+2*-3")
+	monkeypatch.setattr(cache, "FORMAT", cache.FORMAT+1)
+	rebuilt = variant(directory)
+	assert rebuilt.fingerprint() != key
+	assert rebuilt.STATS == built.STATS
+
+
+def test_compile(tmp_path):
+	path = tmp_path/"sum_grammar.py"
+	path.write_text(GRAMMAR)
+	output = compile(str(path), str(tmp_path/"sum_tables.py"))
+	spec = spec_from_file_location("sum_tables", output)
+	tables = module_from_spec(spec)
+	spec.loader.exec_module(tables)
+	grammar = sys.modules["sum_grammar"]
+	assert set(tables.PARSER) == {"ParserSum"}
+	assert set(tables.GRAPH) == {"LexerSum"}
+	key, data = tables.PARSER["ParserSum"]
+	data["stats"] = {"compiled": True}
+	parser = type("ParserSum", (grammar.ParserSum,), {"TABLES": tables}).freeze()
+	assert parser.STATS == {"compiled": True}
+	Lexer = type("LexerSum", (grammar.LexerSum,), {"TABLES": tables, "ENTRIES": list(grammar.LexerSum.ENTRIES)})
+	Lexer.build()
+	lexer = Lexer("1+2+39")
+	tokens, _ = lexer.tokens()
+	assert parser().parse(tokens, lexer) == (42, None)
+	stale = type("ParserSum", (grammar.ParserSum,), {"TABLES": tables, "MINIFY": True}).freeze()
+	assert stale.STATS != {"compiled": True}
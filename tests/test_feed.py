@@ -0,0 +1,63 @@
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "grammars"))
+from lalr.errors import Illegal_Token
+from lalr.lexer import Lexer, token
+from bisqwit.main import LexerBisqwit
+
+
+TEXT = 'function f(){ var x = "é"; /* a comment */ return x; } // end'
+
+
+def lex(cls, chunks):
+	lexer = cls("")
+	tokens = []
+	try:
+		for i, chunk in enumerate(chunks):
+			tokens.extend((token.type, token.value, token.pos) for token in lexer.feed(chunk, i == len(chunks)-1))
+	except Illegal_Token as error:
+		return error.msg, error.pos.pos
+	return tokens
+
+
+def test_chunk_boundaries():
+	for backend in ("re", "master", "graph"):
+		cls = type("Lexer", (LexerBisqwit,), {"BACKEND": backend, "ENTRIES": list(LexerBisqwit.ENTRIES)})
+		cls.build()
+		for text in (TEXT, "x = 1; /* no end", "x ` y"):
+			expected = lex(cls, [text])
+			for cut in range(len(text)+1):
+				assert lex(cls, [text[:cut], text[cut:]]) == expected, (backend, text, cut)
+
+
+def test_unsupported_patterns():
+	for backend in ("re", "master"):
+		class LexerCodes(Lexer):
+			BACKEND = backend
+			ENTRIES = ["a"]
+			@token("a\\d{3}")
+			def _(self, val):
+				return val, "code"
+			@token("(?:bc)+")
+			def _(self, val):
+				return val, "bc"
+		text = "a123abcbc"
+		expected = lex(LexerCodes, [text])
+		for cut in range(len(text)+1):
+			assert lex(LexerCodes, [text[:cut], text[cut:]]) == expected, (backend, cut)
+
+
+def test_illegal_character():
+	lexer = LexerBisqwit("")
+	try:
+		list(lexer.feed("x ` y"))
+	except Illegal_Token as error:
+		assert error.pos.pos == 2
+	else:
+		assert False, "no error before the end of the input"
+
+
+if __name__ == "__main__":
+	test_chunk_boundaries()
+	test_unsupported_patterns()
+	test_illegal_character()
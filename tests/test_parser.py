@@ -0,0 +1,96 @@
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "grammars", "math"))
+from lalr.parser import Handler
+from main import LexerMath, ParserMath
+
+
+TEXTS = ["1+2*3", "-(1-1)*1+1*(1-1-1*2-1)", "2*-3/4", "1+", "(1))"]
+
+
+def variant(**attributes):
+	return type("ParserMath", (ParserMath,), attributes).freeze()
+
+
+def lex(text):
+	lexer = LexerMath(text)
+	tokens, _ = lexer.tokens()
+	return tokens, lexer
+
+
+class Events(Handler):
+	def __init__(self):
+		self.events = []
+
+	def on_shift(self, token):
+		self.events.append(token.value)
+
+	def on_reduce(self, rule, span):
+		self.events.append((rule, span))
+
+	def on_accept(self):
+		self.events.append(None)
+
+
+def test_record():
+	parser = ParserMath()
+	for text in TEXTS:
+		tokens, lexer = lex(text)
+		result, error = parser.parse(tokens, lexer)
+		log, logged = parser.record(tokens, lexer)
+		assert logged == error
+		if error is None:
+			assert log.value() == result
+			root = log.root()
+			assert log.rule(root) is not None
+			assert [log.value(child) for child in log.children(root)][-1] == result[-1]
+
+
+def test_walk():
+	tokens, lexer = lex("1+2*3")
+	handler = Events()
+	assert ParserMath.walk(tokens, lexer, handler) is None
+	shifts = [event for event in handler.events if isinstance(event, float)]
+	assert shifts == [1.0, 2.0, 3.0]
+	assert handler.events[-1] is None
+	_, span = handler.events[-2]
+	assert span == (0, 5)
+	tokens, lexer = lex("1+")
+	assert ParserMath.walk(tokens, lexer, Events()) == ParserMath().parse(tokens, lexer)[1]
+
+
+def test_profile():
+	parser = variant(PROFILE=True)
+	for text in TEXTS[:3]:
+		tokens, lexer = lex(text)
+		assert parser().parse(tokens, lexer) == ParserMath().parse(tokens, lexer)
+	counters = parser.counters()
+	assert counters["parses"] == 3
+	assert sum(counters["shifts"].values()) == sum(len(lex(text)[0])-1 for text in TEXTS[:3])
+	assert set(counters["time"]) == set(counters["reductions"])
+	assert counters["depth"] > 1
+	assert parser.profile_report(limit=2).startswith("3 parses")
+
+
+def test_codegen():
+	for shortcut in (False, True):
+		table = variant(SHORTCUT=shortcut)
+		code = variant(SHORTCUT=shortcut, BACKEND="code")
+		assert code.HANDLERS is not None
+		for text in TEXTS:
+			tokens, lexer = lex(text)
+			assert code().parse(tokens, lexer) == table().parse(tokens, lexer)
+
+
+def test_parse_many(tmp_path):
+	texts = ["1+2*3", "(1-2)/4", "1+"]
+	expected = [ParserMath().parse(*lex(text)) for text in texts]
+	assert list(ParserMath.parse_many(texts, LexerMath, workers=2)) == expected
+	paths = []
+	for i, text in enumerate(texts):
+		path = tmp_path/f"{i}.txt"
+		path.write_text(text)
+		paths.append(str(path))
+	results = list(ParserMath.parse_files(paths, LexerMath, workers=2))
+	assert [result for result, _ in results] == [result for result, _ in expected]
+	assert results[2][1] == expected[2][1].replace('"<stdin>"', f'"{paths[2]}"')
@@ -0,0 +1,129 @@
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "grammars", "math"))
+from lalr.lexer import Lexer, token
+from lalr.lrk import NT, EOF, Rules, RuleEntry, State, lalr, SHIFT, REDUCE, ERROR
+from lalr.parser import Parser, production
+from lalr.table import Table, comb
+from main import LexerMath, ParserMath
+
+
+TEXTS = ["1+2*3", "1-2-3", "-(1-1)*1+1*(1-1-1*2-1)", "2*-3/4", "1+", "(1))"]
+
+
+def variant(**attributes):
+	return type("ParserMath", (ParserMath,), attributes).freeze()
+
+
+def parses(parser, texts=TEXTS):
+	"""Results and whether each text failed, the expected tokens listed in
+	errors depend on the construction"""
+	results = []
+	for text in texts:
+		lexer = LexerMath(text)
+		tokens, _ = lexer.tokens()
+		result, error = parser().parse(tokens, lexer)
+		results.append((result, error is None))
+	return results
+
+
+class LexerChain(Lexer):
+	ENTRIES = ["+", "*", "(", ")"]
+	@token("[0-9]+")
+	def _(self, val):
+		return int(val), "n"
+
+
+E, T, F = NT("E"), NT("T"), NT("F")
+class ParserChain(Parser):
+	START = E
+	@production(E, "+", T, out=E)
+	def _(a, _1, b):
+		return a+b
+	@production(T, out=E)
+	def _(a):
+		return a
+	@production(T, "*", F, out=T)
+	def _(a, _1, b):
+		return a*b
+	@production(F, out=T)
+	def _(a):
+		return a
+	@production("n", out=F)
+	def _(a):
+		return a
+	@production("(", E, ")", out=F)
+	def _(_1, e, _2):
+		return e
+
+
+def test_lalr_states():
+	lr, la = variant(ALGORITHM="lr"), variant(ALGORITHM="lalr")
+	assert la.STATS["states"] < lr.STATS["states"]
+	assert parses(la) == parses(lr)
+
+
+def test_minimise():
+	lr, small = variant(ALGORITHM="lr"), variant(ALGORITHM="lr", MINIFY=True)
+	assert small.STATS["minify"]["states"] == lr.STATS["states"]-small.STATS["states"] > 0
+	assert small.STATS["states"] == variant(ALGORITHM="lalr").STATS["states"]
+	assert parses(small) == parses(lr)
+
+
+def test_table_round_trip():
+	rules = Rules(*ParserMath.ENTRIES)
+	rules.add_precedence(*ParserMath.PRECEDENCE)
+	rules, goto, _ = lalr(rules, ParserMath.START)
+	actions = rules.actions()
+	table = Table(goto, actions)
+	assert table.to_dict() == goto
+	symbols = {product.name: product for product in table.nonterminals if isinstance(product, NT)}
+	loaded = Table.load(table.dump(), actions, symbols)
+	assert loaded.to_dict() == goto
+	assert sorted(loaded.expected(0), key=str) == sorted(table.expected(0), key=str)
+	assert table.action(0, EOF) is None
+	rows = [[(0, 1), (3, 2)], [], [(0, 3), (1, 4), (2, 5)], [(3, 6)]]
+	base, check, value = comb(rows, 4)
+	for s, row in enumerate(rows):
+		assert {c: value[base[s]+c] for c in range(4) if check[base[s]+c] == s} == dict(row)
+
+
+def test_shortcut():
+	plain = type("ParserChain", (ParserChain,), {}).freeze()
+	short = type("ParserChain", (ParserChain,), {"SHORTCUT": True}).freeze()
+	assert short.STATS["shortcut"]["bypass"] > 0
+	for text in ("1+2*3", "(1+2)*3+4", "1+*2"):
+		lexer = LexerChain(text)
+		tokens, _ = lexer.tokens()
+		assert short().parse(tokens, lexer) == plain().parse(tokens, lexer)
+	lexer = LexerChain("(1+2)*3+4")
+	tokens, _ = lexer.tokens()
+	report = short.report(tokens, lexer)
+	assert report["saved"] > 0
+	assert plain.report(tokens, lexer)["saved"] == 0
+
+
+def test_precedence():
+	(left, _), (product, _), (unary, _) = parses(ParserMath, ["1-2-3", "1+2*3", "-(1+2)*3"])
+	assert left == ((1.0, "-", 2.0), "-", 3.0)
+	assert product == (1.0, "+", (2.0, "*", 3.0))
+	assert unary == (("-", (1.0, "+", 2.0)), "*", 3.0)
+	rules = Rules()
+	rules.add_precedence(("nonassoc", "<"), ("left", "+"), ("right", "if"))
+	expression = NT("E")
+	entry = lambda *tokens: RuleEntry(expression, list(tokens))
+	assert rules.resolve(entry(expression, "+", expression), "+") == REDUCE
+	assert rules.resolve(entry(expression, "<", expression), "+") == SHIFT
+	assert rules.resolve(entry(expression, "<", expression), "<") == ERROR
+	assert rules.resolve(entry("if", expression, "then", expression), "+") is None
+
+
+def test_nonassoc_error_stays():
+	rules = Rules()
+	rules.add_precedence(("nonassoc", "<"))
+	expression, unit = NT("E"), NT("P")
+	less = RuleEntry(expression, [expression, "<", expression])
+	state = State(((expression, 0), expression, less, 3, ["<"]), ((unit, 0), unit, RuleEntry(unit, [expression]), 1, ["<"]))
+	shift = {"<": State()}
+	assert state.reductions(shift, rules) == {}
+	assert shift == {}